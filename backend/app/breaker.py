@@ -0,0 +1,118 @@
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Open after this many failures in a row ...
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# ... or when at least this share of the last BREAKER_WINDOW calls timed out
+BREAKER_TIMEOUT_RATE = float(os.getenv("BREAKER_TIMEOUT_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+# How long to fail fast before letting a probe through (half-open)
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the upstream is degraded instead of letting every call
+    wait out its full timeout. Closed: calls pass. Open: calls are refused
+    until open_seconds have passed. Half-open: a single probe call is let
+    through; its success closes the breaker, its failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        timeout_rate: float = BREAKER_TIMEOUT_RATE,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.timeout_rate = timeout_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.open_count = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self._outcomes: deque = deque(maxlen=window)  # True = timed out
+        self._probe_started_at: Optional[float] = None
+
+    def retry_after(self) -> float:
+        if self.state != OPEN or self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == OPEN and self.retry_after() == 0:
+            self.state = HALF_OPEN
+            self._probe_started_at = None
+        if self.state == CLOSED:
+            return True
+        # a probe that never reported back (e.g. cancelled) doesn't block forever
+        probe_lost = self._probe_started_at is not None and now - self._probe_started_at > self.open_seconds
+        if self.state == HALF_OPEN and (self._probe_started_at is None or probe_lost):
+            self._probe_started_at = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self._outcomes.append(False)
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            print(f"Circuit breaker {self.name}: closed (upstream recovered)")
+        self.state = CLOSED
+        self._probe_started_at = None
+
+    def record_failure(self, error: str, timed_out: bool = False):
+        self._outcomes.append(timed_out)
+        self.consecutive_failures += 1
+        self.last_error = error
+
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        timeouts = sum(self._outcomes)
+        too_many_timeouts = (
+            len(self._outcomes) >= self.min_calls
+            and timeouts / len(self._outcomes) >= self.timeout_rate
+        )
+        if self.consecutive_failures >= self.failure_threshold or too_many_timeouts:
+            self._open()
+
+    def _open(self):
+        if self.state != OPEN:
+            self.open_count += 1
+            print(f"Circuit breaker {self.name}: open for {self.open_seconds:.0f}s ({self.last_error})")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._probe_started_at = None
+        self._outcomes.clear()
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "consecutive_failures": self.consecutive_failures,
+            "recent_timeout_rate": round(sum(self._outcomes) / len(self._outcomes), 2) if self._outcomes else 0.0,
+            "times_opened": self.open_count,
+            "rejected_calls": self.rejected,
+            "last_error": self.last_error,
+        }
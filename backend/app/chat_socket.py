@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Callable
+
+from dotenv import load_dotenv
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .session_turns import SessionTurns
+
+load_dotenv()
+
+# Frames buffered per connection before the turns producing them have to
+# wait for the client; this bounds server memory per slow client
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "64"))
+# Turns (sessions) one connection may run at the same time
+WS_MAX_TURNS = int(os.getenv("WS_MAX_TURNS", "8"))
+
+# stream_chatbot(message, session_id) -> (event, data) pairs
+ChatStream = Callable[[str, str], AsyncIterator]
+
+
+class ChatSocketHub:
+    """
+    WebSocket chat with many sessions over one connection.
+
+    Client frames:
+        {"type": "chat", "session_id": "...", "message": "..."}
+        {"type": "cancel", "session_id": "..."}
+    Server frames are the stream_chatbot events tagged with their session:
+        {"type": "token" | "tool_start" | "tool_end" | "done" | "cancelled" | "error",
+         "session_id": "...", ...}
+
+    A session runs one turn at a time across all connections and the HTTP
+    endpoints (`sessions`, shared with /chat and /chat/stream), since turns
+    on the same thread would interleave in the checkpointer.
+    """
+
+    def __init__(
+        self,
+        stream: ChatStream,
+        sessions: SessionTurns,
+        send_queue: int = WS_SEND_QUEUE,
+        max_turns: int = WS_MAX_TURNS,
+    ):
+        self.stream = stream
+        self.sessions = sessions
+        self.send_queue = send_queue
+        self.max_turns = max_turns
+        self.connections = 0
+        self.turns = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.send_waits = 0
+
+    async def serve(self, websocket: WebSocket):
+        connection = ChatConnection(self, websocket)
+        self.connections += 1
+        try:
+            await connection.serve()
+        finally:
+            self.connections -= 1
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "active_sessions": sorted(self.sessions.active),
+            "turns": self.turns,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "coalesced_tokens": self.coalesced,
+            "send_waits": self.send_waits,
+            "send_queue": self.send_queue,
+            "max_turns_per_connection": self.max_turns,
+        }
+
+
+class ChatConnection:
+    """
+    One client socket: a receive loop, a send loop and a task per turn.
+
+    Turn output waits for room once send_queue frames are buffered; replies
+    to control frames (errors, cancel acks) are queued without waiting, so
+    the receive loop never blocks on a slow client and a cancel still gets
+    through while the outbox is full.
+    """
+
+    def __init__(self, hub: ChatSocketHub, websocket: WebSocket):
+        self.hub = hub
+        self.websocket = websocket
+        self.outbox: asyncio.Queue = asyncio.Queue()  # bounded by _put, not maxsize
+        self.room = asyncio.Event()  # set by the send loop as frames go out
+        self.turns: dict = {}  # session_id -> Task
+
+    async def serve(self):
+        await self.websocket.accept()
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while not sender.done():
+                try:
+                    text = await self.websocket.receive_text()
+                except KeyError:
+                    self._reply("error", None, {"message": "Frames must be sent as text."})
+                    continue
+                except (WebSocketDisconnect, RuntimeError):
+                    break
+                self._handle(text)
+        finally:
+            for task in self.turns.values():
+                task.cancel()
+            if self.turns:
+                print(f"Chat socket: client disconnected, cancelled {len(self.turns)} turns")
+                await asyncio.wait(list(self.turns.values()))
+            sender.cancel()
+
+    def _handle(self, text: str):
+        # never awaits: a full outbox must not stop frames (cancel above all) being read
+        try:
+            frame = json.loads(text)
+            kind = frame["type"]
+            session_id = str(frame.get("session_id") or "user1")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._reply("error", None, {"message": "Frames must be JSON objects with a 'type'."})
+            return
+
+        if kind == "chat":
+            message = frame.get("message")
+            if not isinstance(message, str) or not message.strip():
+                self._reply("error", session_id, {"message": "'message' must be a non-empty string."})
+            elif session_id in self.turns or self.hub.sessions.busy(session_id):
+                self.hub.rejected += 1
+                self._reply("error", session_id, {"message": "A turn is already running for this session."})
+            elif len(self.turns) >= self.hub.max_turns:
+                self.hub.rejected += 1
+                self._reply("error", session_id, {
+                    "message": f"At most {self.hub.max_turns} sessions can run at once on one connection."
+                })
+            else:
+                self.hub.turns += 1
+                self.turns[session_id] = asyncio.create_task(self._run_turn(session_id, message))
+        elif kind == "cancel":
+            task = self.turns.get(session_id)
+            if task is None:
+                self._reply("error", session_id, {"message": "No turn is running for this session."})
+                return
+            task.cancel()
+            self.hub.cancelled += 1
+            # acknowledged once the turn has unwound, after its last frames
+            task.add_done_callback(lambda _: self._reply("cancelled", session_id, {}))
+        else:
+            self._reply("error", session_id, {"message": f"Unknown frame type '{kind}'."})
+
+    async def _run_turn(self, session_id: str, message: str):
+        # tokens that arrive while the client is behind are merged into one
+        # frame instead of queueing up one frame each
+        pending = ""
+        try:
+            async for event, data in self.hub.stream(message, session_id):
+                if event == "token":
+                    pending += data["content"]
+                    if self._full():
+                        self.hub.coalesced += 1
+                        continue
+                    self.outbox.put_nowait({"type": "token", "session_id": session_id, "content": pending})
+                    pending = ""
+                    continue
+                if pending:
+                    await self._put("token", session_id, {"content": pending})
+                    pending = ""
+                await self._put(event, session_id, data)
+        except Exception as e:
+            await self._put("error", session_id, {"message": str(e)})
+        finally:
+            self.turns.pop(session_id, None)
+
+    def _full(self) -> bool:
+        return self.outbox.qsize() >= self.hub.send_queue
+
+    async def _put(self, event: str, session_id, data: dict):
+        """Queue a frame of turn output, waiting while the client is behind."""
+        if self._full():
+            self.hub.send_waits += 1
+        while self._full():
+            self.room.clear()
+            await self.room.wait()
+        self.outbox.put_nowait({"type": event, "session_id": session_id, **data})
+
+    def _reply(self, event: str, session_id, data: dict):
+        """Queue a control reply; one per client frame, so never waits."""
+        self.outbox.put_nowait({"type": event, "session_id": session_id, **data})
+
+    async def _send_loop(self):
+        try:
+            while True:
+                frame = await self.outbox.get()
+                self.room.set()
+                await self.websocket.send_text(json.dumps(frame, default=str))
+        except Exception:
+            pass  # the socket is gone; the receive loop sees the disconnect
@@ -0,0 +1,961 @@
+import asyncio
+import hashlib
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from .db import BASE_DIR
+
+load_dotenv()
+
+# "sqlite" keeps conversations across restarts and shares them between
+# uvicorn workers; "memory" is the old per-process MemorySaver
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+# A file of its own so graph steps never contend with the OAuth token DB
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(BASE_DIR, "checkpoints.db"))
+# Serialized values at least this big are zlib-compressed (message history
+# is repetitive msgpack: ~10x smaller for well under a millisecond)
+CHECKPOINT_COMPRESS_MIN = int(os.getenv("CHECKPOINT_COMPRESS_MIN", "512"))
+# Most writes the writer thread folds into one transaction
+CHECKPOINT_BATCH_MAX = int(os.getenv("CHECKPOINT_BATCH_MAX", "256"))
+CHECKPOINT_READERS = int(os.getenv("CHECKPOINT_READERS", "4"))
+
+# Session limits. Both backends keep at most SESSION_MAX_CHECKPOINTS
+# checkpoints per session and drop sessions idle for SESSION_IDLE_TTL
+# seconds (0 keeps them forever), checked every SESSION_SWEEP_INTERVAL.
+# The in-memory backend (CHECKPOINTER=memory) also evicts the least
+# recently used sessions past SESSION_MAX_SESSIONS or
+# SESSION_MEMORY_BUDGET_MB in total (spilled to SESSION_SPILL_DIR when
+# set) and caps each session at SESSION_MAX_MB of state
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MEMORY_BUDGET = int(float(os.getenv("SESSION_MEMORY_BUDGET_MB", "256")) * 1024 * 1024)
+SESSION_MAX_CHECKPOINTS = int(os.getenv("SESSION_MAX_CHECKPOINTS", "20"))
+SESSION_MAX_BYTES = int(float(os.getenv("SESSION_MAX_MB", "4")) * 1024 * 1024)
+# Spilling compresses and writes a whole session to disk on eviction and
+# reads it back on the next use (milliseconds for long chats); with a spill
+# dir set the async checkpoint calls run on a worker thread to keep that
+# off the event loop
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "")
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_threads (
+    thread_id TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+"""
+
+
+class CompressedSerializer:
+    """
+    LangGraph's msgpack serializer, with values of min_size bytes or more
+    zlib-compressed. The stored type says which: "msgpack" or "msgpack+zlib".
+    """
+
+    SUFFIX = "+zlib"
+
+    def __init__(self, serde: Optional[JsonPlusSerializer] = None, min_size: int = CHECKPOINT_COMPRESS_MIN, level: int = 1):
+        self.serde = serde or JsonPlusSerializer()
+        self.min_size = min_size
+        self.level = level
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def dumps_typed(self, obj: Any) -> tuple:
+        type_, data = self.serde.dumps_typed(obj)
+        self.raw_bytes += len(data)
+        if len(data) >= self.min_size:
+            type_, data = type_ + self.SUFFIX, zlib.compress(data, self.level)
+        self.stored_bytes += len(data)
+        return type_, data
+
+    def loads_typed(self, data: tuple) -> Any:
+        type_, payload = data
+        if type_.endswith(self.SUFFIX):
+            return self.serde.loads_typed((type_[:-len(self.SUFFIX)], zlib.decompress(payload)))
+        return self.serde.loads_typed(data)
+
+    def with_msgpack_allowlist(self, extra_allowlist) -> "CompressedSerializer":
+        inner = self.serde.with_msgpack_allowlist(extra_allowlist)
+        if inner is self.serde:
+            return self
+        return CompressedSerializer(inner, self.min_size, self.level)
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer on a SQLite file in WAL mode, so every uvicorn
+    worker (or a restarted one) can resume any thread_id.
+
+    All writes go through one writer thread that commits whatever has
+    queued up meanwhile in a single transaction (group commit): concurrent
+    sessions share fsyncs, and each caller still returns only once its
+    write is durable. Reads use per-thread connections, which WAL lets run
+    alongside the writer.
+
+    The writer also keeps the file bounded: each put drops the thread's
+    checkpoints past max_checkpoints (with their writes and the blobs only
+    they used), and threads not written for idle_ttl seconds are deleted.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_DB_PATH,
+        serde: Optional[CompressedSerializer] = None,
+        batch_max: int = CHECKPOINT_BATCH_MAX,
+        readers: int = CHECKPOINT_READERS,
+        max_checkpoints: int = SESSION_MAX_CHECKPOINTS,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL,
+    ):
+        super().__init__(serde=serde or CompressedSerializer())
+        self.path = path
+        self.batch_max = batch_max
+        self.max_checkpoints = max(max_checkpoints, 1)
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="checkpoint-read")
+
+        self.writes = 0
+        self.batches = 0
+        self.commit_seconds = 0.0
+        self.reads = 0
+        self.read_seconds = 0.0
+        self.pruned_checkpoints = 0
+        self.expired_threads = 0
+
+    # -- Connections --
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        # in WAL mode NORMAL only risks the last commits on power loss,
+        # never corruption, and saves an fsync per transaction
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _start(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    conn = self._connect()
+                    conn.executescript(SCHEMA)
+                    # threads saved before checkpoint_threads existed start their idle clock now
+                    conn.execute(
+                        "INSERT OR IGNORE INTO checkpoint_threads SELECT DISTINCT thread_id, ? FROM checkpoints",
+                        (time.time(),),
+                    )
+                    self._writer = threading.Thread(
+                        target=self._write_loop, args=(conn,), name="checkpoint-writer", daemon=True
+                    )
+                    self._writer.start()
+
+    def _reader(self) -> sqlite3.Connection:
+        self._start()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # -- Writer --
+
+    def _submit(self, statements: list) -> Future:
+        """
+        statements: [(sql, rows)] run with executemany, or callables run
+        with the writer's connection, all committed together.
+        """
+        self._start()
+        future: Future = Future()
+        self._queue.put((statements, future))
+        return future
+
+    def _write_loop(self, conn: sqlite3.Connection):
+        last_sweep = time.monotonic()
+        while True:
+            if self.idle_ttl > 0 and time.monotonic() - last_sweep >= self.sweep_interval:
+                last_sweep = time.monotonic()
+                self._expire_idle(conn)
+            try:
+                item = self._queue.get(timeout=self.sweep_interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_max:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+
+            try:
+                self._commit(conn, batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # one bad write must not fail the others it was grouped with
+                for one in batch:
+                    try:
+                        self._commit(conn, [one])
+                    except Exception as e:
+                        one[1].set_exception(e)
+                    else:
+                        one[1].set_result(None)
+                continue
+            for _, future in batch:
+                future.set_result(None)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statements, _ in batch:
+                self._execute(conn, statements)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self.commit_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.writes += len(batch)
+
+    def _execute(self, conn: sqlite3.Connection, statements: list):
+        for statement in statements:
+            if callable(statement):
+                statement(conn)
+            else:
+                sql, rows = statement
+                conn.executemany(sql, rows)
+
+    # -- Retention --
+
+    def _prune(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str):
+        """Drop the thread's checkpoints past max_checkpoints, newest kept."""
+        # a failed prune must not fail the put it rides along with
+        conn.execute("SAVEPOINT prune")
+        try:
+            self._prune_thread(conn, thread_id, checkpoint_ns)
+        except Exception as e:
+            conn.execute("ROLLBACK TO prune")
+            print(f"Checkpointer: pruning thread {thread_id} failed: {e}")
+        conn.execute("RELEASE prune")
+
+    def _prune_thread(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str):
+        dropped = [
+            (thread_id, checkpoint_ns, row[0])
+            for row in conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.max_checkpoints),
+            )
+        ]
+        if not dropped:
+            return
+        for table in ("checkpoints", "checkpoint_writes"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", dropped
+            )
+
+        # versions only grow, so a channel's blobs older than the oldest
+        # version a kept checkpoint points at are no longer reachable
+        oldest: dict = {}
+        for type_, data in conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ):
+            for channel, version in self.serde.loads_typed((type_, data))["channel_versions"].items():
+                oldest[channel] = min(oldest.get(channel, str(version)), str(version))
+        conn.executemany(
+            "DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version < ?",
+            [(thread_id, checkpoint_ns, channel, version) for channel, version in oldest.items()],
+        )
+        conn.execute(
+            f"DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+            f"AND channel NOT IN ({', '.join('?' * len(oldest))})",
+            (thread_id, checkpoint_ns, *oldest),
+        )
+        self.pruned_checkpoints += len(dropped)
+
+    def _expire_idle(self, conn: sqlite3.Connection):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            idle = [
+                row[0] for row in conn.execute(
+                    "SELECT thread_id FROM checkpoint_threads WHERE last_used < ?", (time.time() - self.idle_ttl,)
+                )
+            ]
+            for thread_id in idle:
+                self._execute(conn, self._delete_statements(thread_id))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # e.g. another worker holding the write lock; try again next sweep
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Checkpointer: idle sweep failed: {e}")
+            return
+        if idle:
+            self.expired_threads += len(idle)
+            print(f"Checkpointer: deleted {len(idle)} idle threads")
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        self._readers.shutdown(wait=False)
+
+    # -- Serialization --
+
+    def _put_statements(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values = c.pop("channel_values")
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version),
+             *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)))
+            for channel, version in new_versions.items()
+        ]
+        row = (
+            thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+            *self.serde.dumps_typed(c),
+            *self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+        )
+        statements = [
+            ("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [row]),
+            ("INSERT OR REPLACE INTO checkpoint_threads VALUES (?, ?)", [(thread_id, time.time())]),
+            lambda conn: self._prune(conn, thread_id, checkpoint_ns),
+        ]
+        if blobs:
+            statements.insert(0, ("INSERT OR IGNORE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?, ?)", blobs))
+        next_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+        return statements, next_config
+
+    def _writes_statements(self, config: RunnableConfig, writes: Sequence, task_id: str, task_path: str):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+             channel, *self.serde.dumps_typed(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # special channels (errors, interrupts) overwrite; normal writes are
+        # kept from the first attempt, like MemorySaver
+        verb = "REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "IGNORE"
+        return [(f"INSERT OR {verb} INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)]
+
+    def _delete_statements(self, thread_id: str):
+        return [
+            (f"DELETE FROM {table} WHERE thread_id = ?", [(str(thread_id),)])
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes", "checkpoint_threads")
+        ]
+
+    def _tuple(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, checkpoint_b, metadata_type, metadata_b = row
+        checkpoint = self.serde.loads_typed((type_, checkpoint_b))
+
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = conn.execute(
+                "SELECT type, blob FROM checkpoint_blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob)
+
+        writes = conn.execute(
+            "SELECT task_id, idx, channel, type, value, task_path FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        writes.sort(key=lambda w: writes_sort_key(w[5], w[0], w[1]))
+
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_b)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(w[0], w[2], self.serde.loads_typed((w[3], w[4]))) for w in writes],
+        )
+
+    # -- BaseCheckpointSaver --
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        started = time.perf_counter()
+        conn = self._reader()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        if checkpoint_id := get_checkpoint_id(config):
+            row = conn.execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        result = self._tuple(conn, thread_id, checkpoint_ns, row) if row else None
+        self.reads += 1
+        self.read_seconds += time.perf_counter() - started
+        return result
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        conn = self._reader()
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_id)
+        sql = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+        )
+        for row in conn.execute(sql, params).fetchall():
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._tuple(conn, row[0], row[1], row[2:])
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        statements, next_config = self._put_statements(config, checkpoint, metadata, new_versions)
+        self._submit(statements).result()
+        return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence, task_id: str, task_path: str = "") -> None:
+        self._submit(self._writes_statements(config, writes, task_id, task_path)).result()
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._submit(self._delete_statements(thread_id)).result()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        loop = asyncio.get_running_loop()
+        tuples = await loop.run_in_executor(
+            self._readers, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in tuples:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        statements, next_config = self._put_statements(config, checkpoint, metadata, new_versions)
+        await asyncio.wrap_future(self._submit(statements))
+        return next_config
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence, task_id: str, task_path: str = "") -> None:
+        await asyncio.wrap_future(self._submit(self._writes_statements(config, writes, task_id, task_path)))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.wrap_future(self._submit(self._delete_statements(thread_id)))
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # same scheme as MemorySaver: zero-padded counter, random tiebreak
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def with_allowlist(self, extra_allowlist) -> "SQLiteCheckpointer":
+        serde = self.serde.with_msgpack_allowlist(extra_allowlist)
+        if serde is self.serde:
+            return self
+        # shares the writer and connections: only the serializer differs
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.serde = serde
+        return clone
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "writes": self.writes,
+            "transactions": self.batches,
+            "writes_per_transaction": round(self.writes / self.batches, 2) if self.batches else 0.0,
+            "avg_commit_ms": round(self.commit_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+            "queued_writes": self._queue.qsize(),
+            "reads": self.reads,
+            "avg_read_ms": round(self.read_seconds / self.reads * 1000, 3) if self.reads else 0.0,
+            "serialized_bytes": self.serde.raw_bytes,
+            "stored_bytes": self.serde.stored_bytes,
+            "max_checkpoints": self.max_checkpoints,
+            "pruned_checkpoints": self.pruned_checkpoints,
+            "expired_threads": self.expired_threads,
+        }
+
+    def sessions(self, limit: int = 100) -> dict:
+        """Per-session bytes on disk, largest first."""
+        conn = self._reader()
+        usage: dict = {}
+        for sql in (
+            "SELECT thread_id, COUNT(*), SUM(LENGTH(checkpoint) + LENGTH(metadata)) FROM checkpoints GROUP BY thread_id",
+            "SELECT thread_id, 0, SUM(IFNULL(LENGTH(blob), 0)) FROM checkpoint_blobs GROUP BY thread_id",
+            "SELECT thread_id, 0, SUM(IFNULL(LENGTH(value), 0)) FROM checkpoint_writes GROUP BY thread_id",
+        ):
+            for thread_id, count, size in conn.execute(sql):
+                row = usage.setdefault(thread_id, {"thread_id": thread_id, "checkpoints": 0, "bytes": 0})
+                row["checkpoints"] += count
+                row["bytes"] += size or 0
+        rows = sorted(usage.values(), key=lambda r: r["bytes"], reverse=True)
+        return {
+            **self.stats(),
+            "sessions": len(rows),
+            "bytes": sum(r["bytes"] for r in rows),
+            "top_sessions": rows[:limit],
+        }
+
+
+class _SessionUsage:
+    __slots__ = ("last_used", "bytes", "checkpoints")
+
+    def __init__(self):
+        self.last_used = time.monotonic()
+        self.bytes = 0
+        self.checkpoints = 0
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that forgets. Each session keeps at most max_checkpoints
+    checkpoints and max_bytes of serialized state, older checkpoints going
+    first. The latest one carries the whole history, so a session it alone
+    puts over max_bytes is dropped and its next turn starts over. Sessions
+    idle for idle_ttl, and the
+    least recently used ones past max_sessions or memory_budget, are
+    evicted, spilled to spill_dir first when one is set and loaded back
+    the next time the session is used.
+    """
+
+    def __init__(
+        self,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        memory_budget: int = SESSION_MEMORY_BUDGET,
+        max_checkpoints: int = SESSION_MAX_CHECKPOINTS,
+        max_bytes: int = SESSION_MAX_BYTES,
+        spill_dir: str = SESSION_SPILL_DIR,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL,
+    ):
+        # compressed like the SQLite backend: history takes ~10x less RAM
+        super().__init__(serde=CompressedSerializer())
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.max_checkpoints = max(max_checkpoints, 1)
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.sweep_interval = sweep_interval
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._sessions: OrderedDict = OrderedDict()  # thread_id -> _SessionUsage, LRU first
+        self._versions: dict = {}  # thread_id -> {(ns, checkpoint_id): channel_versions}
+        self._total_bytes = 0
+        self._last_sweep = time.monotonic()
+        # sessions dropped over max_bytes; the rest of their turn isn't stored
+        self._dropped: dict = {}  # thread_id -> monotonic time dropped
+
+        self.evictions = {"idle": 0, "lru": 0, "budget": 0, "quota": 0}
+        self.pruned_checkpoints = 0
+        self.spilled = 0
+        self.restored = 0
+
+    # -- Bookkeeping --
+
+    def _touch(self, thread_id: str) -> Optional[_SessionUsage]:
+        usage = self._sessions.get(thread_id)
+        if usage is not None:
+            usage.last_used = time.monotonic()
+            self._sessions.move_to_end(thread_id)
+        return usage
+
+    def _blob_keys(self, thread_id: str) -> set:
+        return {
+            (thread_id, ns, channel, version)
+            for (ns, _), versions in self._versions.get(thread_id, {}).items()
+            for channel, version in versions.items()
+        }
+
+    def _measure(self, thread_id: str, usage: _SessionUsage):
+        size = 0
+        count = 0
+        for ns, checkpoints in self.storage.get(thread_id, {}).items():
+            for checkpoint_id, (checkpoint, metadata, _) in checkpoints.items():
+                count += 1
+                size += len(checkpoint[1]) + len(metadata[1])
+                for write in self.writes.get((thread_id, ns, checkpoint_id), {}).values():
+                    size += len(write[2][1])
+        for key in self._blob_keys(thread_id):
+            blob = self.blobs.get(key)
+            if blob is not None:
+                size += len(blob[1] or b"")
+        self._total_bytes += size - usage.bytes
+        usage.bytes = size
+        usage.checkpoints = count
+
+    def _drop_checkpoint(self, thread_id: str, ns: str, checkpoint_id: str):
+        live = self._blob_keys(thread_id)
+        self.storage[thread_id][ns].pop(checkpoint_id, None)
+        self.writes.pop((thread_id, ns, checkpoint_id), None)
+        self._versions[thread_id].pop((ns, checkpoint_id), None)
+        for key in live - self._blob_keys(thread_id):
+            self.blobs.pop(key, None)
+        self.pruned_checkpoints += 1
+
+    def _enforce_quota(self, thread_id: str, usage: _SessionUsage):
+        oldest_first = sorted(self._versions.get(thread_id, {}), key=lambda k: k[1])
+        excess = len(oldest_first) - self.max_checkpoints
+        for ns, checkpoint_id in oldest_first[:max(excess, 0)]:
+            self._drop_checkpoint(thread_id, ns, checkpoint_id)
+        self._measure(thread_id, usage)
+        for ns, checkpoint_id in oldest_first[max(excess, 0):-1]:
+            if usage.bytes <= self.max_bytes:
+                break
+            self._drop_checkpoint(thread_id, ns, checkpoint_id)
+            self._measure(thread_id, usage)
+        if usage.bytes > self.max_bytes:
+            # not spilled: restoring it would put it straight back over
+            print(f"Checkpointer: session {thread_id} holds {usage.bytes} bytes in one checkpoint, dropping it")
+            self._forget(thread_id)
+            self._dropped[thread_id] = time.monotonic()
+            self.evictions["quota"] += 1
+
+    def _evict_overflow(self, keep: str):
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            idle = [t for t, u in self._sessions.items() if t != keep and now - u.last_used > self.idle_ttl]
+            for thread_id in idle:
+                self._evict(thread_id, "idle")
+            self._dropped = {t: at for t, at in self._dropped.items() if now - at <= self.idle_ttl}
+        for thread_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions and self._total_bytes <= self.memory_budget:
+                break
+            if thread_id != keep:
+                self._evict(thread_id, "lru" if len(self._sessions) > self.max_sessions else "budget")
+
+    def _forget(self, thread_id: str):
+        for key in self._blob_keys(thread_id):
+            self.blobs.pop(key, None)
+        for ns, checkpoint_id in self._versions.pop(thread_id, {}):
+            self.writes.pop((thread_id, ns, checkpoint_id), None)
+        self.storage.pop(thread_id, None)
+        usage = self._sessions.pop(thread_id, None)
+        if usage is not None:
+            self._total_bytes -= usage.bytes
+
+    # -- Spill to disk --
+
+    def _spill_path(self, thread_id: str) -> str:
+        name = hashlib.sha256(str(thread_id).encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.session")
+
+    def _evict(self, thread_id: str, reason: str):
+        if self.spill_dir:
+            self._spill(thread_id)
+        self._forget(thread_id)
+        self.evictions[reason] += 1
+
+    def _spill(self, thread_id: str):
+        checkpoints = [
+            [ns, checkpoint_id, *checkpoint, *metadata, parent_id,
+             self._versions[thread_id].get((ns, checkpoint_id), {}),
+             [[*key, task_id, channel, *value, path]
+              for key, (task_id, channel, value, path) in self.writes.get((thread_id, ns, checkpoint_id), {}).items()]]
+            for ns, stored in self.storage.get(thread_id, {}).items()
+            for checkpoint_id, (checkpoint, metadata, parent_id) in stored.items()
+        ]
+        blobs = [
+            [ns, channel, version, *self.blobs[(thread_id, ns, channel, version)]]
+            for _, ns, channel, version in self._blob_keys(thread_id)
+            if (thread_id, ns, channel, version) in self.blobs
+        ]
+        type_, data = self.serde.dumps_typed({"thread_id": thread_id, "checkpoints": checkpoints, "blobs": blobs})
+        path = self._spill_path(thread_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(type_.encode() + b"\n" + zlib.compress(data, 1))
+        os.replace(path + ".tmp", path)
+        self.spilled += 1
+
+    def _restore(self, thread_id: str):
+        if thread_id in self._sessions or not self.spill_dir:
+            return
+        path = self._spill_path(thread_id)
+        try:
+            with open(path, "rb") as f:
+                type_, data = f.read().split(b"\n", 1)
+        except FileNotFoundError:
+            return
+        saved = self.serde.loads_typed((type_.decode(), zlib.decompress(data)))
+        versions = self._versions.setdefault(thread_id, {})
+        for ns, checkpoint_id, c_type, c_data, m_type, m_data, parent_id, channel_versions, writes in saved["checkpoints"]:
+            self.storage[thread_id][ns][checkpoint_id] = ((c_type, c_data), (m_type, m_data), parent_id)
+            versions[(ns, checkpoint_id)] = channel_versions
+            for task_id, idx, task_id_, channel, v_type, v_data, path_ in writes:
+                self.writes[(thread_id, ns, checkpoint_id)][(task_id, idx)] = (task_id_, channel, (v_type, v_data), path_)
+        for ns, channel, version, b_type, b_data in saved["blobs"]:
+            self.blobs[(thread_id, ns, channel, version)] = (b_type, b_data)
+        usage = self._sessions[thread_id] = _SessionUsage()
+        self._measure(thread_id, usage)
+        os.remove(path)
+        self.restored += 1
+        # the restored session may push others past max_sessions or the budget
+        self._evict_overflow(keep=thread_id)
+
+    # -- MemorySaver --
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            # the next turn loads (and rebuilds) the session from scratch
+            self._dropped.pop(thread_id, None)
+            self._restore(thread_id)
+            result = super().get_tuple(config)
+            if self._touch(thread_id) is None and not any(self.storage.get(thread_id, {}).values()):
+                # MemorySaver's defaultdicts leave an empty entry per lookup
+                self.storage.pop(thread_id, None)
+            return result
+
+    def list(self, config: Optional[RunnableConfig], **kwargs) -> Iterator[CheckpointTuple]:
+        if config:
+            with self._lock:
+                self._restore(config["configurable"]["thread_id"])
+        return super().list(config, **kwargs)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id in self._dropped:
+                return {"configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                    "checkpoint_id": checkpoint["id"],
+                }}
+            self._restore(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            ns = next_config["configurable"]["checkpoint_ns"]
+            self._versions.setdefault(thread_id, {})[(ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            usage = self._touch(thread_id)
+            if usage is None:
+                usage = self._sessions[thread_id] = _SessionUsage()
+            self._enforce_quota(thread_id, usage)
+            self._evict_overflow(keep=thread_id)
+            return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence, task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._restore(thread_id)
+            ns = config["configurable"].get("checkpoint_ns", "")
+            if config["configurable"]["checkpoint_id"] not in self.storage.get(thread_id, {}).get(ns, {}):
+                return  # its checkpoint was pruned, or the session dropped
+            super().put_writes(config, writes, task_id, task_path)
+            usage = self._touch(thread_id)
+            if usage is not None:
+                self._measure(thread_id, usage)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._dropped.pop(thread_id, None)
+            self._forget(thread_id)
+            super().delete_thread(thread_id)
+            if self.spill_dir and os.path.exists(self._spill_path(thread_id)):
+                os.remove(self._spill_path(thread_id))
+
+    # -- Async --
+
+    async def _offload(self, fn, *args):
+        # eviction and restore only touch the disk when spilling is on;
+        # otherwise every call is a few dict operations and stays inline
+        if self.spill_dir:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _list_locked(self, config: Optional[RunnableConfig], kwargs: dict) -> list:
+        with self._lock:
+            return list(self.list(config, **kwargs))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._offload(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs) -> AsyncIterator[CheckpointTuple]:
+        for item in await self._offload(self._list_locked, config, kwargs):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return await self._offload(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence, task_id: str, task_path: str = "") -> None:
+        await self._offload(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._offload(self.delete_thread, thread_id)
+
+    # -- Reporting --
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes,
+                "memory_budget": self.memory_budget,
+                "evictions": dict(self.evictions),
+                "pruned_checkpoints": self.pruned_checkpoints,
+                "spilled": self.spilled,
+                "restored": self.restored,
+            }
+
+    def sessions(self, limit: int = 100) -> dict:
+        """Per-session usage, largest first."""
+        now = time.monotonic()
+        with self._lock:
+            rows = [
+                {
+                    "thread_id": thread_id,
+                    "checkpoints": usage.checkpoints,
+                    "bytes": usage.bytes,
+                    "idle_seconds": round(now - usage.last_used, 1),
+                    "over_quota": usage.bytes > self.max_bytes,
+                }
+                for thread_id, usage in self._sessions.items()
+            ]
+            spilled = len([n for n in os.listdir(self.spill_dir) if n.endswith(".session")]) if self.spill_dir else 0
+        rows.sort(key=lambda r: r["bytes"], reverse=True)
+        return {
+            **self.stats(),
+            "spilled_on_disk": spilled,
+            "limits": {
+                "idle_ttl_seconds": self.idle_ttl,
+                "max_sessions": self.max_sessions,
+                "max_checkpoints": self.max_checkpoints,
+                "max_bytes": self.max_bytes,
+            },
+            "top_sessions": rows[:limit],
+        }
+
+
+def make_checkpointer(kind: str = CHECKPOINTER) -> BaseCheckpointSaver:
+    """Checkpointer named by CHECKPOINTER: 'sqlite' (default) or 'memory'."""
+    if kind == "sqlite":
+        return SQLiteCheckpointer()
+    if kind == "memory":
+        return BoundedMemorySaver()
+    raise ValueError(f"Unknown CHECKPOINTER '{kind}', expected 'sqlite' or 'memory'")
@@ -0,0 +1,11 @@
+def parse_overrides(spec: str) -> dict:
+    """
+    Per-name numeric settings from an env var:
+    'queryPowerStationList=2, search_web=4' -> {'queryPowerStationList': 2.0, 'search_web': 4.0}
+    """
+    values = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            values[name.strip()] = float(value)
+    return values
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os 
@@ -6,9 +6,18 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DB_PATH = os.path.join(BASE_DIR, "oauth.db")
+DB_PATH = os.getenv("OAUTH_DB_PATH", os.path.join(BASE_DIR, "oauth.db"))
 DATABASE_URL=f"sqlite:///{DB_PATH}"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread":False})
 
+# WAL lets every uvicorn worker read the token while one of them writes it,
+# busy_timeout makes concurrent writers wait instead of failing with "database is locked"
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 SessionLocal = sessionmaker(bind=engine)
 Base=declarative_base()
@@ -0,0 +1,197 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Opt-in: send a second identical request when the first is slower than the
+# endpoint's HEDGE_PERCENTILE latency, keep whichever answers first
+ISOLARCLOUD_HEDGING = os.getenv("ISOLARCLOUD_HEDGING", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Extra requests allowed, as a share of all requests (0.1 = at most ~10% more load)
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "5"))
+# No hedging until an endpoint has this many samples; never hedge sooner than HEDGE_MIN_DELAY
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))
+
+# Histogram bucket upper bounds: 10 ms to ~60 s, each 25% wider than the last
+_BOUNDS = [0.01 * 1.25 ** i for i in range(40)]
+
+
+class LatencyHistogram:
+    """
+    Rolling latency histogram over the last `window` samples. Samples are
+    counted into log-spaced buckets, so a percentile is a walk over ~40
+    counters and is accurate to one bucket width (25%).
+    """
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.samples: deque = deque()
+        self.window = window
+
+    def record(self, seconds: float):
+        bucket = bisect.bisect_left(_BOUNDS, seconds)
+        if len(self.samples) >= self.window:
+            self.counts[self.samples.popleft()] -= 1
+        self.samples.append(bucket)
+        self.counts[bucket] += 1
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        rank = p / 100 * len(self.samples)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return _BOUNDS[bucket] if bucket < len(_BOUNDS) else _BOUNDS[-1]
+        return _BOUNDS[-1]
+
+
+class HedgeBudget:
+    """Every request earns `ratio` of a hedge; a hedge spends one whole token."""
+
+    def __init__(self, ratio: float = HEDGE_BUDGET, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def earn(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Hedger:
+    """
+    Runs a request and, if it has not answered after the endpoint's
+    percentile latency, races an identical second one against it. The first
+    answer wins and the other request is cancelled. An exception only counts
+    as an answer once no other request is left running.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = ISOLARCLOUD_HEDGING,
+        percentile: float = HEDGE_PERCENTILE,
+        budget: Optional[HedgeBudget] = None,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget or HedgeBudget()
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._histograms: dict = {}
+        self._counts: dict = {}
+
+    def _histogram(self, endpoint: str) -> LatencyHistogram:
+        return self._histograms.setdefault(endpoint, LatencyHistogram())
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        histogram = self._histogram(endpoint)
+        if len(histogram) < self.min_samples:
+            return None
+        return max(histogram.percentile(self.percentile), self.min_delay)
+
+    async def run(
+        self,
+        endpoint: str,
+        send: Callable[[], Awaitable],
+        may_hedge: Optional[Callable[[], Awaitable[bool]]] = None,
+    ):
+        """
+        `send` issues one request. `may_hedge` is asked right before the
+        second request goes out (e.g. to take a rate-limit token) and can veto it.
+        """
+        counts = self._counts.setdefault(endpoint, {"requests": 0, "hedged": 0, "hedge_won": 0, "skipped_budget": 0})
+        counts["requests"] += 1
+        self.budget.earn()
+        histogram = self._histogram(endpoint)
+
+        delay = self.hedge_delay(endpoint) if self.enabled else None
+        started = time.monotonic()
+        primary = asyncio.ensure_future(send())
+        try:
+            if delay is None:
+                result = await primary
+                histogram.record(time.monotonic() - started)
+                return result
+
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                histogram.record(time.monotonic() - started)
+                return primary.result()
+
+            if not self.budget.spend():
+                counts["skipped_budget"] += 1
+                result = await primary
+                histogram.record(time.monotonic() - started)
+                return result
+            if may_hedge is not None and not await may_hedge():
+                self.budget.tokens += 1  # refund: the hedge never went out
+                result = await primary
+                histogram.record(time.monotonic() - started)
+                return result
+
+            counts["hedged"] += 1
+            hedge = asyncio.ensure_future(send())
+            try:
+                return await self._race(primary, hedge, counts, histogram, started)
+            finally:
+                hedge.cancel()
+        finally:
+            primary.cancel()
+
+    async def _race(self, primary, hedge, counts, histogram, started):
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    first_error = first_error or task.exception()
+                    continue
+                if task is hedge:
+                    counts["hedge_won"] += 1
+                # a cancelled primary was at least this slow; recording it
+                # keeps the tail from shrinking every time a hedge wins
+                histogram.record(time.monotonic() - started)
+                return task.result()
+        raise first_error
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "budget_tokens": round(self.budget.tokens, 2),
+            "endpoints": {
+                endpoint.rsplit("/", 1)[-1]: {
+                    **counts,
+                    "samples": len(self._histogram(endpoint)),
+                    "p50_ms": _ms(self._histogram(endpoint).percentile(50)),
+                    "p99_ms": _ms(self._histogram(endpoint).percentile(99)),
+                    "hedge_delay_ms": _ms(self.hedge_delay(endpoint)),
+                }
+                for endpoint, counts in self._counts.items()
+            },
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
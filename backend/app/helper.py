@@ -1,15 +1,35 @@
 from typing import cast, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv 
-import httpx
+import asyncio
+import functools
 import os 
+import socket
 import time
-from .models import init_db, OAuthToken
+from .models import init_db, OAuthToken, TokenLease
 from .db import SessionLocal
+from .http_client import get_http_client
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 load_dotenv()
 
 scid = os.getenv("SUNGROW_APP_KEY")
 scs = os.getenv("SUNGROW_APP_SECRET")
 
+# Seconds before expires_at at which the cached token is treated as expired,
+# so a token never runs out while a request using it is in flight.
+TOKEN_EXPIRY_SKEW = int(os.getenv("TOKEN_EXPIRY_SKEW", "30"))
+# Threads reserved for OAuthToken reads/writes (kept off the event loop)
+TOKEN_DB_WORKERS = int(os.getenv("TOKEN_DB_WORKERS", "2"))
+# Cross-process refresh lease: how long a holder may take, and how often
+# the other workers re-read the table while they wait for the new token
+TOKEN_LEASE_TTL = float(os.getenv("TOKEN_LEASE_TTL", "30"))
+TOKEN_LEASE_POLL = float(os.getenv("TOKEN_LEASE_POLL", "0.5"))
+
+def lease_holder():
+    # computed per call: forked workers must not share the parent's pid
+    return f"{socket.gethostname()}:{os.getpid()}"
+
 def save_token(provider, access_token, refresh_token, expires_in):
     db = SessionLocal()
     expires_at = int(time.time()) + expires_in if expires_in else None
@@ -31,6 +51,83 @@ def load_token(provider):
     db.close()
     return token
 
+def acquire_refresh_lease(provider, holder, ttl):
+    """
+    Take the refresh lease for provider if it is free, expired or already ours.
+    The conditional UPDATE runs under SQLite's write lock, so at most one
+    process can win it. Returns True when holder owns the lease.
+    """
+    db = SessionLocal()
+    try:
+        now = time.time()
+        if db.get(TokenLease, provider) is None:
+            db.add(TokenLease(provider=provider, holder=None, expires_at=0))
+            try:
+                db.commit()
+            except IntegrityError:
+                # another process created the row first
+                db.rollback()
+        acquired = db.query(TokenLease).filter(
+            TokenLease.provider == provider,
+            or_(TokenLease.holder == holder, TokenLease.expires_at < now),
+        ).update({"holder": holder, "expires_at": now + ttl}, synchronize_session=False)
+        db.commit()
+        return acquired == 1
+    finally:
+        db.close()
+
+def release_refresh_lease(provider, holder):
+    db = SessionLocal()
+    try:
+        db.query(TokenLease).filter(
+            TokenLease.provider == provider, TokenLease.holder == holder
+        ).update({"holder": None, "expires_at": 0}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+class TokenRepository:
+    """
+    Async access to the OAuthToken table for the async code paths.
+    The blocking SQLAlchemy calls run on a small dedicated thread pool,
+    so SQLite I/O never stalls the event loop and never queues behind
+    unrelated work on the default executor.
+    """
+
+    def __init__(self, max_workers: int = TOKEN_DB_WORKERS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="token-db"
+        )
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def init(self):
+        await self._run(init_db)
+
+    async def load(self, provider) -> Optional[OAuthToken]:
+        return await self._run(load_token, provider)
+
+    async def save(self, provider, access_token, refresh_token, expires_in):
+        await self._run(
+            save_token,
+            provider=provider,
+            access_token=access_token,
+            refresh_token=refresh_token,
+            expires_in=expires_in,
+        )
+
+    async def acquire_lease(self, provider, ttl=TOKEN_LEASE_TTL) -> bool:
+        return await self._run(acquire_refresh_lease, provider, lease_holder(), ttl)
+
+    async def release_lease(self, provider):
+        await self._run(release_refresh_lease, provider, lease_holder())
+
+token_repo = TokenRepository()
+
 def is_token_expired(token:OAuthToken):
     exp = cast(Optional[int], token.expires_at)
     if exp is None:
@@ -38,44 +135,156 @@ def is_token_expired(token:OAuthToken):
     return time.time() > exp
 
 async def refresh_access_token():
-        token = load_token("isolarcloud")
+        token = await token_repo.load("isolarcloud")
         if not token: 
             raise Exception("Token is not present")
 
         if token.refresh_token is None:
             raise Exception("No refresh Token Available")
 
-        async with httpx.AsyncClient() as client:
-            res= await client.post(
-                "https://gateway.isolarcloud.com.hk/openapi/apiManage/refreshToken",
-                headers={
-                        "Content-Type" : "Application/json",
-                        "x-access-key" : scs or ""
-                },
-                json={
-                    "refresh_token" : token.refresh_token,
-                    "appkey": scid
-                }
-            )
-            data = res.json()
-            if data.get("result_code") != "1":
-                raise Exception("Failed to Refresh Token")
-            result =data["result_data"]
-            save_token(
-                provider="isolarcloud",
-                access_token=result["access_token"],
-                refresh_token=result["refresh_token"],
-                expires_in= result["expires_in"]
-            )
+        client = get_http_client()
+        res= await client.post(
+            "https://gateway.isolarcloud.com.hk/openapi/apiManage/refreshToken",
+            headers={
+                    "Content-Type" : "Application/json",
+                    "x-access-key" : scs or ""
+            },
+            json={
+                "refresh_token" : token.refresh_token,
+                "appkey": scid
+            }
+        )
+        data = res.json()
+        if data.get("result_code") != "1":
+            raise Exception("Failed to Refresh Token")
+        result =data["result_data"]
+        await token_repo.save(
+            provider="isolarcloud",
+            access_token=result["access_token"],
+            refresh_token=result["refresh_token"],
+            expires_in= result["expires_in"]
+        )
+        token_cache.set(
+            result["access_token"],
+            int(time.time()) + result["expires_in"] if result["expires_in"] else None
+        )
+
+class TokenCache:
+    """
+    In-memory holder for the access token of one provider.
+    While the cached token is valid it is served without any DB I/O.
+    When it is missing or expired, exactly one coroutine loads / refreshes it
+    and every other caller awaits that same refresh.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.access_token: Optional[str] = None
+        self.expires_at: Optional[int] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._db_ready = False
+
+    def is_valid(self) -> bool:
+        if self.access_token is None:
+            return False
+        if self.expires_at is None:
+            return True
+        return time.time() < self.expires_at - TOKEN_EXPIRY_SKEW
+
+    def set(self, access_token, expires_at):
+        self.access_token = access_token
+        self.expires_at = expires_at
+
+    def invalidate(self):
+        self.access_token = None
+        self.expires_at = None
+
+    async def get(self) -> str:
+        if self.is_valid():
+            return cast(str, self.access_token)
+
+        return await self._join_refresh(force=False)
+
+    async def reject(self, access_token: str) -> str:
+        """
+        The API refused access_token, e.g. revoked upstream after another
+        worker's refresh rotated it. Drop it and return a fresh token: the
+        one another process stored if there is one, else a refreshed one.
+        """
+        if self.access_token != access_token and self.is_valid():
+            return cast(str, self.access_token)  # already replaced meanwhile
+        try:
+            return await self._join_refresh(force=True)
+        except Exception:
+            self.invalidate()
+            raise
+
+    async def refresh(self) -> str:
+        """
+        Renew the token even if the cached one is still valid.
+        Used by the background refresher; joins a refresh already in flight.
+        """
+        return await self._join_refresh(force=True)
+
+    async def _join_refresh(self, force: bool) -> str:
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._load_or_refresh(force))
+            self._refresh_task.add_done_callback(self._clear_refresh_task)
+
+        # shield: a cancelled caller must not cancel the refresh the others wait on
+        return await asyncio.shield(self._refresh_task)
+
+    def _clear_refresh_task(self, task):
+        if self._refresh_task is task:
+            self._refresh_task = None
+
+    async def _load_or_refresh(self, force: bool = False) -> str:
+        if not self._db_ready:
+            await token_repo.init()
+            self._db_ready = True
+
+        stale_token = self.access_token
+        # Another process (or an earlier refresh) may already have stored a fresh token
+        token = await token_repo.load(self.provider)
+        if token:
+            self.set(token.access_token, cast(Optional[int], token.expires_at))
+        if (force and self.access_token == stale_token) or not self.is_valid():
+            await self._refresh_under_lease(self.access_token)
+        if self.access_token is None:
+            raise RuntimeError("Failed to obtail access Token")
+        return self.access_token
+
+    def _adopt(self, token, stale_token) -> bool:
+        """Use a token another process stored, if it replaced stale_token and is valid."""
+        if token is None or token.access_token == stale_token:
+            return False
+        self.set(token.access_token, cast(Optional[int], token.expires_at))
+        return self.is_valid()
+
+    async def _refresh_under_lease(self, stale_token):
+        """
+        Refresh across uvicorn workers: only the lease holder calls the refresh
+        endpoint (which rotates the refresh token), the rest wait for its new row.
+        """
+        while True:
+            if await token_repo.acquire_lease(self.provider):
+                try:
+                    # The previous holder may have stored a new token just before releasing
+                    if self._adopt(await token_repo.load(self.provider), stale_token):
+                        return
+                    # refresh_access_token() stores the new token in this cache
+                    await refresh_access_token()
+                finally:
+                    await token_repo.release_lease(self.provider)
+                return
+
+            await asyncio.sleep(TOKEN_LEASE_POLL)
+            if self._adopt(await token_repo.load(self.provider), stale_token):
+                return
+
+token_cache = TokenCache("isolarcloud")
 
 async def get_valid_token():
-    init_db()
-    token = load_token("isolarcloud")
-    if not token or is_token_expired(token):
-        await refresh_access_token()
-        token = load_token("isolarcloud")
-    if token is None:
-        raise RuntimeError("Failed to obtail access Token")
-    return token.access_token
+    return await token_cache.get()
 
 
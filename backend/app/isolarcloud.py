@@ -0,0 +1,473 @@
+import asyncio
+import json
+import math
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Optional, Union
+
+import httpx
+from dotenv import load_dotenv
+
+from .breaker import CircuitBreaker
+from .hedging import Hedger
+from .helper import get_valid_token, token_cache
+from .http_client import get_http_client
+from .ratelimit import RateLimitError, RateLimiter
+from .retry import Retry, with_retries
+from .singleflight import SingleFlight
+
+load_dotenv()
+
+# Configuration
+SC_APP_KEY = os.getenv("SUNGROW_APP_KEY")
+SC_APP_SECRET = os.getenv("SUNGROW_APP_SECRET")
+API_BASE = "https://gateway.isolarcloud.com.hk"
+
+# Retries for transient failures (5xx, timeouts, dropped connections):
+# delay = base * 2^attempt, capped, with jitter
+ISOLARCLOUD_MAX_RETRIES = int(os.getenv("ISOLARCLOUD_MAX_RETRIES", "2"))
+ISOLARCLOUD_BACKOFF_BASE = float(os.getenv("ISOLARCLOUD_BACKOFF_BASE", "0.5"))
+ISOLARCLOUD_BACKOFF_MAX = float(os.getenv("ISOLARCLOUD_BACKOFF_MAX", "4"))
+
+# Plant list pagination: page size and how many pages are fetched at once
+ISOLARCLOUD_PAGE_SIZE = int(os.getenv("ISOLARCLOUD_PAGE_SIZE", "50"))
+ISOLARCLOUD_PAGE_CONCURRENCY = int(os.getenv("ISOLARCLOUD_PAGE_CONCURRENCY", "4"))
+
+# getPowerStationDetail: IDs per request and how many requests run at once
+ISOLARCLOUD_DETAIL_CHUNK_SIZE = int(os.getenv("ISOLARCLOUD_DETAIL_CHUNK_SIZE", "20"))
+ISOLARCLOUD_DETAIL_CONCURRENCY = int(os.getenv("ISOLARCLOUD_DETAIL_CONCURRENCY", "4"))
+
+QUERY_POWER_STATION_LIST = "/openapi/platform/queryPowerStationList"
+GET_POWER_STATION_DETAIL = "/openapi/platform/getPowerStationDetail"
+QUERY_PS_DETAIL = "/openapi/platform/queryPsDetail"
+# idempotent reads: safe to send twice when hedging
+HEDGED_ENDPOINTS = {QUERY_POWER_STATION_LIST, GET_POWER_STATION_DETAIL, QUERY_PS_DETAIL}
+
+
+#                           -- Errors --
+
+class ISolarCloudError(Exception):
+    """Base class for iSolarCloud failures; the message is written to be shown to the user as is."""
+
+
+class ISolarCloudAuthError(ISolarCloudError):
+    def __init__(self, cause: Exception):
+        super().__init__(f"Authentication Failed: Could not retrieve token. Error: {cause}")
+
+
+class ISolarCloudHTTPError(ISolarCloudError):
+    """Non-retryable HTTP status (4xx)."""
+
+    def __init__(self, status_code: int, body: str):
+        self.status_code = status_code
+        self.body = body
+        super().__init__(f"HTTP Error: {status_code} - {body}")
+
+
+class ISolarCloudTransientError(ISolarCloudError):
+    """5xx / timeout / connection failure that persisted through every retry."""
+
+    def __init__(self, detail: str):
+        super().__init__(f"Connection Error: {detail}")
+
+
+class ISolarCloudUnavailableError(ISolarCloudError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(
+            "UPSTREAM UNAVAILABLE: the iSolarCloud gateway is not responding "
+            f"(circuit open, next check in {retry_after:.0f}s). "
+            "Do not retry iSolarCloud tools now; tell the user plant data is temporarily unavailable."
+        )
+
+
+class ISolarCloudAPIError(ISolarCloudError):
+    """The gateway answered, but result_code != '1'."""
+
+    def __init__(self, result_code, result_msg):
+        self.result_code = result_code
+        self.result_msg = result_msg
+        super().__init__(f"iSolarCloud API Error: {result_msg or 'Unknown Error'} (result_code {result_code})")
+
+
+def token_rejected(error: ISolarCloudError) -> bool:
+    """A 401, or an API error saying the access token is invalid or expired."""
+    if isinstance(error, ISolarCloudHTTPError):
+        return error.status_code == 401
+    if isinstance(error, ISolarCloudAPIError):
+        # e.g. "er_token_login_invalid"
+        return "token" in str(error.result_msg or "").lower()
+    return False
+
+
+#                           -- Records --
+
+def split_ps_ids(ps_ids: Union[str, Iterable]) -> list:
+    """'1711005, 1688245,,1711005' -> ['1711005', '1688245'] (order kept, duplicates dropped)"""
+    if isinstance(ps_ids, str):
+        ps_ids = ps_ids.split(",")
+    cleaned = (str(i).strip() for i in ps_ids)
+    return list(dict.fromkeys(i for i in cleaned if i))
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class PlantSummary:
+    """One entry of queryPowerStationList's pageList."""
+    ps_id: str
+    ps_name: Optional[str]
+    ps_location: Optional[str]
+    install_date: Optional[str]
+    online_status: Optional[int]
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    @property
+    def is_online(self) -> bool:
+        # 1 = Online, everything else = Offline/Fault/Unknown
+        return self.online_status == 1
+
+    @property
+    def coordinates(self) -> Optional[tuple]:
+        if self.latitude is None or self.longitude is None:
+            return None
+        return self.latitude, self.longitude
+
+    @classmethod
+    def from_api(cls, p: dict) -> "PlantSummary":
+        return cls(
+            ps_id=str(p.get("ps_id", "N/A")),
+            ps_name=p.get("ps_name"),
+            ps_location=p.get("ps_location"),
+            install_date=p.get("install_date"),
+            online_status=p.get("online_status"),
+            latitude=_to_float(p.get("latitude")),
+            longitude=_to_float(p.get("longitude")),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class PlantPage:
+    plants: list
+    row_count: int
+
+
+@dataclass(frozen=True, slots=True)
+class PlantDetail:
+    """One entry of getPowerStationDetail's data_list."""
+    ps_id: str
+    ps_name: Optional[str]
+    ps_location: Optional[str]
+    install_date: Optional[str]
+    install_power: Optional[float]  # Watts
+    feedin_price: Optional[str]
+    price_unit: Optional[str]
+    online_status: Optional[int]
+
+    @property
+    def is_online(self) -> bool:
+        return self.online_status == 1
+
+    @property
+    def capacity_kw(self) -> Optional[float]:
+        return self.install_power / 1000 if self.install_power else None
+
+    @classmethod
+    def from_api(cls, p: dict) -> "PlantDetail":
+        return cls(
+            ps_id=str(p.get("ps_id", "N/A")),
+            ps_name=p.get("ps_name"),
+            ps_location=p.get("ps_location"),
+            install_date=p.get("install_date"),
+            install_power=_to_float(p.get("install_power")),
+            feedin_price=p.get("ps_feedin_power_price_wh"),
+            price_unit=p.get("power_price_unit"),
+            online_status=p.get("online_status"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ChunkFailure:
+    ps_ids: tuple
+    error: str
+
+
+@dataclass(frozen=True, slots=True)
+class DetailBatch:
+    """Details in the order the IDs were requested, plus the chunks that failed."""
+    plants: list
+    failures: list
+
+
+@dataclass(frozen=True, slots=True)
+class PlantRealtime:
+    """result_data of queryPsDetail."""
+    ps_id: str
+    ps_name: Optional[str]
+    ps_location: Optional[str]
+    curr_power: Optional[float]    # kW
+    day_energy: Optional[float]    # kWh
+    total_energy: Optional[float]  # kWh
+
+    @classmethod
+    def from_api(cls, ps_id, res: dict) -> "PlantRealtime":
+        return cls(
+            ps_id=str(ps_id),
+            ps_name=res.get("ps_name"),
+            ps_location=res.get("ps_location"),
+            curr_power=_to_float(res.get("curr_power")),
+            day_energy=_to_float(res.get("day_energy")),
+            total_energy=_to_float(res.get("total_energy")),
+        )
+
+
+#                           -- Client --
+
+class ISolarCloudClient:
+    """
+    Async client for the iSolarCloud OpenAPI.
+    Handles auth headers, retries with exponential backoff on transient
+    failures and result_code checking in one place; callers get typed records
+    or an ISolarCloudError.
+    """
+
+    def __init__(
+        self,
+        base_url: str = API_BASE,
+        app_key: Optional[str] = SC_APP_KEY,
+        app_secret: Optional[str] = SC_APP_SECRET,
+        max_retries: int = ISOLARCLOUD_MAX_RETRIES,
+        backoff_base: float = ISOLARCLOUD_BACKOFF_BASE,
+        backoff_max: float = ISOLARCLOUD_BACKOFF_MAX,
+        page_size: int = ISOLARCLOUD_PAGE_SIZE,
+        page_concurrency: int = ISOLARCLOUD_PAGE_CONCURRENCY,
+        detail_chunk_size: int = ISOLARCLOUD_DETAIL_CHUNK_SIZE,
+        detail_concurrency: int = ISOLARCLOUD_DETAIL_CONCURRENCY,
+    ):
+        self.base_url = base_url
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.page_size = page_size
+        self.page_concurrency = page_concurrency
+        self.detail_chunk_size = detail_chunk_size
+        self.detail_concurrency = detail_concurrency
+        # identical in-flight reads (same endpoint + payload) share one upstream call
+        self.single_flight = SingleFlight()
+        # appkey quota: every attempt (retries included) takes a token
+        self.rate_limiter = RateLimiter()
+        # fail fast while the gateway is degraded instead of waiting out timeouts
+        self.breaker = CircuitBreaker("isolarcloud")
+        # opt-in (ISOLARCLOUD_HEDGING): duplicate slow reads to cut tail latency
+        self.hedger = Hedger()
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        """
+        POST to an OpenAPI endpoint and return its result_data.
+        Concurrent calls with the same endpoint and payload are coalesced.
+        """
+        key = json.dumps(payload, sort_keys=True, default=str)
+        return await self.single_flight.do(key, lambda: self._send(path, payload), label=path)
+
+    async def _send(self, path: str, payload: dict) -> dict:
+        url = f"{self.base_url}{path}"
+        body = {"appkey": self.app_key, **payload}
+        used_token = None
+
+        async def attempt() -> dict:
+            nonlocal used_token
+            try:
+                access_token = used_token = await get_valid_token()
+            except Exception as e:
+                raise ISolarCloudAuthError(e) from e
+
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+                "x-access-key": self.app_secret or ""
+            }
+            if not self.breaker.allow():
+                raise ISolarCloudUnavailableError(self.breaker.retry_after())
+            try:
+                await self.rate_limiter.acquire(path)
+            except RateLimitError as e:
+                raise ISolarCloudTransientError(str(e)) from e
+            try:
+                response = await self._request(path, url, headers, body)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = ISolarCloudTransientError(f"{type(e).__name__} {e}".strip())
+                self.breaker.record_failure(str(error), timed_out=isinstance(e, httpx.TimeoutException))
+                raise Retry(error) from e
+
+            if response.status_code >= 500:
+                error = ISolarCloudTransientError(f"HTTP {response.status_code} - {response.text}")
+                self.breaker.record_failure(str(error))
+                raise Retry(error)
+            if response.status_code >= 400:
+                # the gateway itself is up; the request was refused
+                self.breaker.record_success()
+                raise ISolarCloudHTTPError(response.status_code, response.text)
+            try:
+                data = response.json()
+                result_code = data.get("result_code")
+            except (ValueError, AttributeError) as e:
+                # an HTML maintenance page or proxy error served as 2xx
+                error = ISolarCloudTransientError(
+                    f"unreadable response (HTTP {response.status_code}) - {response.text[:200]}"
+                )
+                error.__cause__ = e
+                self.breaker.record_failure(str(error))
+                raise Retry(error) from e
+
+            self.breaker.record_success()
+            if result_code != "1":
+                raise ISolarCloudAPIError(result_code, data.get("result_msg"))
+            return data.get("result_data") or {}
+
+        try:
+            return await with_retries(attempt, self.max_retries, self.backoff_base, self.backoff_max)
+        except (ISolarCloudHTTPError, ISolarCloudAPIError) as e:
+            if used_token is None or not token_rejected(e):
+                raise
+            # the cached token was revoked upstream; renew it and try once more
+            print(f"iSolarCloud: {path} rejected the access token ({e}), renewing it")
+            try:
+                await token_cache.reject(used_token)
+            except Exception as auth_error:
+                raise ISolarCloudAuthError(auth_error) from auth_error
+        return await with_retries(attempt, self.max_retries, self.backoff_base, self.backoff_max)
+
+    async def _request(self, path: str, url: str, headers: dict, body: dict) -> httpx.Response:
+        def send():
+            return get_http_client().post(url, headers=headers, json=body)
+
+        if path not in HEDGED_ENDPOINTS:
+            return await send()
+        # the hedge takes its own rate-limit token, or isn't sent
+        return await self.hedger.run(path, send, may_hedge=lambda: self.rate_limiter.try_acquire(path))
+
+    async def query_power_station_list(self, page: int = 1, size: int = 10) -> PlantPage:
+        result_data = await self._post(QUERY_POWER_STATION_LIST, {
+            "page": page,
+            "size": size,
+            "ps_type": "1,3,4,5",
+            "valid_flag": "1,3",
+        })
+        plants = [PlantSummary.from_api(p) for p in result_data.get("pageList") or []]
+        return PlantPage(plants=plants, row_count=int(result_data.get("rowCount") or len(plants)))
+
+    def stats(self) -> dict:
+        return {
+            "coalescing": self.single_flight.stats(),
+            "rate_limit": self.rate_limiter.stats(),
+            "circuit_breaker": self.breaker.status(),
+            "hedging": self.hedger.stats(),
+        }
+
+    async def list_all_power_stations(self) -> list:
+        """
+        The whole fleet: reads rowCount from page 1, then fetches the remaining
+        pages concurrently (at most page_concurrency at a time) and merges
+        them in page order.
+        """
+        first = await self.query_power_station_list(page=1, size=self.page_size)
+        total_pages = math.ceil(first.row_count / self.page_size)
+        if total_pages <= 1:
+            return list(first.plants)
+
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def fetch(page: int) -> PlantPage:
+            async with semaphore:
+                return await self.query_power_station_list(page=page, size=self.page_size)
+
+        rest = await asyncio.gather(*[fetch(page) for page in range(2, total_pages + 1)])
+        plants = list(first.plants)
+        for page in rest:
+            plants.extend(page.plants)
+        return plants
+
+    async def iter_power_station_pages(self) -> AsyncIterator[PlantPage]:
+        """
+        Stream the fleet page by page, in order, for callers that don't need
+        the whole list in memory. Up to page_concurrency pages are prefetched.
+        """
+        first = await self.query_power_station_list(page=1, size=self.page_size)
+        yield first
+        total_pages = math.ceil(first.row_count / self.page_size)
+
+        pending: deque = deque()
+        next_page = 2
+        try:
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < self.page_concurrency:
+                    pending.append(asyncio.ensure_future(
+                        self.query_power_station_list(page=next_page, size=self.page_size)
+                    ))
+                    next_page += 1
+                yield await pending.popleft()
+        finally:
+            # consumer stopped early (break / aclose): drop the prefetched pages
+            for task in pending:
+                task.cancel()
+
+    async def get_power_station_detail(self, ps_ids: Union[str, Iterable]) -> list:
+        if not isinstance(ps_ids, str):
+            ps_ids = ",".join(str(i) for i in ps_ids)
+        result_data = await self._post(GET_POWER_STATION_DETAIL, {"ps_ids": ps_ids})
+        return [PlantDetail.from_api(p) for p in result_data.get("data_list") or []]
+
+    async def get_power_station_details(self, ps_ids: Union[str, Iterable]) -> DetailBatch:
+        """
+        getPowerStationDetail for any number of IDs: split into chunks of
+        detail_chunk_size, fetched concurrently (at most detail_concurrency
+        at a time). A failing chunk is reported in DetailBatch.failures
+        instead of failing the whole call.
+        """
+        ids = split_ps_ids(ps_ids)
+        size = max(self.detail_chunk_size, 1)
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+        semaphore = asyncio.Semaphore(self.detail_concurrency)
+
+        async def fetch(chunk: list) -> list:
+            async with semaphore:
+                return await self.get_power_station_detail(chunk)
+
+        results = await asyncio.gather(*[fetch(c) for c in chunks], return_exceptions=True)
+
+        by_id = {}
+        failures = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, ISolarCloudError):
+                failures.append(ChunkFailure(tuple(chunk), str(result)))
+            elif isinstance(result, Exception):
+                # anything else still only costs this chunk its plants
+                print(f"iSolarCloud: detail chunk failed unexpectedly: {type(result).__name__} {result}")
+                failures.append(ChunkFailure(tuple(chunk), f"Unexpected Error: {type(result).__name__} {result}".strip()))
+            elif isinstance(result, BaseException):
+                raise result  # cancellation
+            else:
+                for plant in result:
+                    by_id[plant.ps_id] = plant
+
+        # merge in the order the IDs were asked for
+        plants = [by_id[i] for i in ids if i in by_id]
+        return DetailBatch(plants=plants, failures=failures)
+
+    async def query_ps_detail(self, ps_id) -> PlantRealtime:
+        result_data = await self._post(QUERY_PS_DETAIL, {"ps_id": ps_id})
+        return PlantRealtime.from_api(ps_id, result_data)
+
+
+isolarcloud = ISolarCloudClient()
@@ -1,22 +1,35 @@
 from typing import Annotated
 from typing_extensions import TypedDict
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
 
 from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, SystemMessage 
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
 
 from pydantic import BaseModel
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph.message import add_messages
 import asyncio
+import json
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from backend.tools import ALL_TOOLS
+from backend.app.token_refresher import token_refresher
+from backend.app.http_client import open_http_client, close_http_client
+from backend.app.plant_registry import plant_detail_cache, plant_registry
+from backend.app.isolarcloud import isolarcloud
+from backend.app.ratelimit import current_session
+from backend.app.weather import weather_client
+from backend.app.tool_executor import tool_executor
+from backend.app.search_cache import search_cache
+from backend.app.chat_socket import ChatSocketHub
+from backend.app.session_turns import SessionBusyError, session_turns
+from backend.app.checkpointer import make_checkpointer
 
 load_dotenv()
 
@@ -45,8 +58,9 @@ You MUST:
 If the user asks about a specific plant by name (e.g., "Ovobel Foods Limited"):
 
 You MUST:
-- FIRST call list_solar_plants
-- Extract the numeric ps_id for the plant
+- FIRST call resolve_plant_ids with the plant name(s), separated by semicolons
+- Use the numeric ps_id of the best match (a score below 0.5 means it is only a guess:
+  ask the user to confirm)
 - If no match is found, respond:
   "I couldn't find a plant with that name in your account."
 
@@ -63,7 +77,7 @@ CRITICAL CONSTRAINTS (NON-NEGOTIABLE)
 - NEVER call solar_plants_basic_info unless a plant name is explicitly requested
 - NEVER use web search for private plant data
 - NEVER say "data fetched" without displaying results
-- NEVER skip list_solar_plants before solar_plants_basic_info
+- NEVER call solar_plants_basic_info with IDs that did not come from resolve_plant_ids or list_solar_plants
 
 ────────────────────────────────────────
 RESPONSE FORMATTING RULES
@@ -89,6 +103,10 @@ FAILURE HANDLING
 If a plant name is not found:
 "I couldn't find a plant with that name in your account."
 
+If a tool result starts with "UPSTREAM UNAVAILABLE":
+- Do NOT call any plant tool again in this turn
+- Tell the user the plant data service is temporarily unavailable and to try again shortly
+
 You MUST obey these rules exactly.
 
 """
@@ -112,12 +130,13 @@ class AgentState(TypedDict):
 
 #                        -- Nodes --
 
-def chatbot_node(state :AgentState):
+async def chatbot_node(state :AgentState):
     """
     The main node that calls the LLM.
     Receivese Current State/ History and returns LLM's new message.
     """
-    response = model_with_tools.invoke(state["messages"])
+    # async so the call streams tokens (stream_mode="messages") without a thread
+    response = await model_with_tools.ainvoke(state["messages"])
     return {"messages" : [response]}
 
 #Buit-In tool node will handle manual tool_executor.
@@ -150,29 +169,50 @@ workflow.add_edge("final", END)
 
 #                       -- Persistance --
 
-#memory Saver 
-checkpointer = MemorySaver()
+# SQLite by default so any worker can pick up any session and history
+# survives restarts; CHECKPOINTER=memory keeps it in process, with idle
+# sessions evicted and per-session quotas (see BoundedMemorySaver)
+checkpointer = make_checkpointer()
 
 
 bot = workflow.compile(checkpointer=checkpointer)
 
 
+async def build_input(user_message: str, config: dict) -> list:
+    input_messages = [HumanMessage(content=user_message)]
+    #if history is empty Strictly enforce System Prompt at start
+    state_snapshot = await bot.aget_state(config)
+    history = state_snapshot.values.get("messages", [])
+
+    if len(history) == 0:
+        input_messages.insert(0, SystemMessage(content=SYSTEM_PROMPT))
+    elif isinstance(history[-1], AIMessage) and history[-1].tool_calls:
+        # a cancelled run (client disconnected) left tool calls unanswered;
+        # the model API rejects history like that, so close them out
+        input_messages[:0] = [
+            ToolMessage(content="Cancelled: the user disconnected before this finished.", tool_call_id=call["id"])
+            for call in history[-1].tool_calls
+        ]
+    return input_messages
+
+
 async def run_chatbot(user_message: str, session_id: str= "default"):
     """
     Runs the chatbot for a specific sessoin
     """
 
     config = {"configurable" : {"thread_id": session_id}}
+    # lets the iSolarCloud rate limiter queue this session's calls fairly
+    current_session.set(session_id)
 
-    #if new session -> Add system prompt first
-    #for now we will add system prompt for every query
+    # raises SessionBusyError while another turn of this session runs
+    with session_turns.hold(session_id):
+        return await _run_turn(user_message, config)
 
-    input_messages = [HumanMessage(content=user_message)]
-    #if history is empty Strictly enforce System Prompt at start
-    state_snapshot = await bot.aget_state(config)
 
-    if len(state_snapshot.values.get("messages", [])) == 0:
-        input_messages.insert(0, SystemMessage(content=SYSTEM_PROMPT))
+async def _run_turn(user_message: str, config: dict):
+    #if new session -> Add system prompt first
+    input_messages = await build_input(user_message, config)
 
     #Stream the events
     #stream_mode= 'values' gives the full list of messages at each step
@@ -190,7 +230,7 @@ async def run_chatbot(user_message: str, session_id: str= "default"):
             if last_message.content:
                 print(f"DEBUG STEP: {last_message.type.upper()}")
                 
-            if isinstance(last_message, type(model.invoke("test"))):
+            if isinstance(last_message, AIMessage):
                 final_response = last_message.content
 
     snapshot = await bot.aget_state(config)
@@ -199,7 +239,71 @@ async def run_chatbot(user_message: str, session_id: str= "default"):
 
     return final_response
 
-app = FastAPI(title="Solar AI Backend")
+
+async def stream_chatbot(user_message: str, session_id: str = "default"):
+    """
+    Same run as run_chatbot, yielded as (event, data) while it happens:
+    'token' for each piece of the answer, 'tool_start' / 'tool_end' around
+    tool calls, and 'done' with the final answer.
+    """
+    config = {"configurable" : {"thread_id": session_id}}
+    current_session.set(session_id)
+    with session_turns.hold(session_id):
+        async for event, data in _stream_turn(user_message, config):
+            yield event, data
+
+
+async def _stream_turn(user_message: str, config: dict):
+    input_messages = await build_input(user_message, config)
+
+    events = bot.astream(
+            {"messages" : input_messages},
+            config,
+            stream_mode=["messages", "updates"]
+    )
+    async for mode, chunk in events:
+        if mode == "messages":
+            message, metadata = chunk
+            if (
+                metadata.get("langgraph_node") == "agent"
+                and isinstance(message, AIMessageChunk)
+                and isinstance(message.content, str)
+                and message.content
+            ):
+                yield "token", {"content": message.content}
+            continue
+
+        for node, update in chunk.items():
+            for message in (update or {}).get("messages", []):
+                if node == "agent" and isinstance(message, AIMessage):
+                    for call in message.tool_calls:
+                        yield "tool_start", {"id": call["id"], "name": call["name"], "args": call["args"]}
+                elif node == "tools" and isinstance(message, ToolMessage):
+                    content = str(message.content)
+                    yield "tool_end", {
+                        "id": message.tool_call_id,
+                        "name": message.name,
+                        "status": message.status,
+                        "preview": content[:200],
+                    }
+
+    snapshot = await bot.aget_state(config)
+    messages = snapshot.values.get("messages") or []
+    yield "done", {"response": messages[-1].content if messages else ""}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled keep-alive client for every iSolarCloud call
+    await open_http_client()
+    # Renew the iSolarCloud token ahead of expiry so /chat never waits on it
+    token_refresher.start()
+    yield
+    await token_refresher.stop()
+    await close_http_client()
+    if hasattr(checkpointer, "close"):
+        checkpointer.close()
+
+app = FastAPI(title="Solar AI Backend", lifespan=lifespan)
 
 # CORS (required for Streamlit / browser access)
 app.add_middleware(
@@ -222,20 +326,139 @@ class Query(BaseModel):
 def health():
     return {"status": "ok"}
 
+# -------- Token refresher status --------
+
+@app.get("/status/token")
+def token_status():
+    return token_refresher.status()
+
+@app.get("/status/plant-registry")
+def plant_registry_status():
+    return plant_registry.stats()
+
+@app.get("/status/plant-details")
+def plant_details_status():
+    return plant_detail_cache.stats()
+
+@app.get("/status/upstream")
+def upstream_status():
+    return isolarcloud.stats()
+
+@app.get("/status/weather")
+def weather_status():
+    return weather_client.stats()
+
+@app.get("/status/tools")
+def tools_status():
+    return tool_executor.stats()
+
+@app.get("/status/search-cache")
+def search_cache_status():
+    return search_cache.stats()
+
+@app.get("/status/checkpointer")
+def checkpointer_status():
+    if hasattr(checkpointer, "stats"):
+        return checkpointer.stats()
+    return {"backend": type(checkpointer).__name__}
+
+@app.get("/admin/sessions")
+def admin_sessions(limit: int = 100):
+    """Conversation state per session, largest first."""
+    if hasattr(checkpointer, "sessions"):
+        return checkpointer.sessions(limit)
+    return {"backend": type(checkpointer).__name__}
+
+@app.get("/status/chat-sockets")
+def chat_sockets_status():
+    return chat_sockets.stats()
+
 # -------- Chat endpoint --------
 
+# Comment line sent while a tool runs so proxies don't close an idle stream
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_events(query: "Query", request: Request):
+    """
+    The graph runs in its own task feeding a queue. If the client goes away,
+    Starlette stops this generator and the finally block cancels the run.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for event, data in stream_chatbot(query.message, query.session_id):
+                await queue.put((event, data))
+        except Exception as e:
+            await queue.put(("error", {"message": str(e)}))
+        finally:
+            await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            yield sse(*item)
+    finally:
+        if not producer.done():
+            producer.cancel()
+            print(f"Chat stream for {query.session_id}: client disconnected, run cancelled")
+
 @app.post("/chat")
 async def chat(query: Query):
     """
     Chat endpoint used by Streamlit frontend
     """
-    response = await run_chatbot(
-        user_message=query.message,
-        session_id=query.session_id
-    )
+    try:
+        response = await run_chatbot(
+            user_message=query.message,
+            session_id=query.session_id
+        )
+    except SessionBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
     return {"response": response}
 
+@app.post("/chat/stream")
+async def chat_stream(query: Query, request: Request):
+    """
+    Server-Sent Events version of /chat: answer tokens as they are
+    generated, plus tool_start / tool_end events, then 'done'.
+    """
+    # refuse up front; stream_chatbot still holds the session for the run
+    if session_turns.busy(query.session_id):
+        raise HTTPException(status_code=409, detail=str(SessionBusyError(query.session_id)))
+    return StreamingResponse(
+        sse_events(query, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Many sessions over one WebSocket, for dashboards keeping several open
+chat_sockets = ChatSocketHub(stream_chatbot, session_turns)
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """
+    Send {"type": "chat", "session_id", "message"} to start a turn and
+    {"type": "cancel", "session_id"} to stop one; the /chat/stream events
+    come back as JSON frames tagged with their session_id.
+    """
+    await chat_sockets.serve(websocket)
+
 if __name__ == "__main__":
     async def main():
         print("--- Starting Solar Assistant----")
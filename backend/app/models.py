@@ -1,5 +1,5 @@
 # models.py in root
-from sqlalchemy import Column, String, Integer, Text
+from sqlalchemy import Column, String, Integer, Text, Float
 from .db import Base, engine
 
 class OAuthToken(Base):
@@ -12,6 +12,33 @@ class OAuthToken(Base):
     auth_user = Column(String)
     auth_ps_list = Column(Text, nullable=True)
 
+class TokenLease(Base):
+    """
+    Cross-process lock row: the process holding an unexpired lease for a
+    provider is the only one allowed to call the refresh endpoint.
+    """
+    __tablename__ = "token_leases"
+    provider = Column(String, primary_key=True)
+    holder = Column(String, nullable=True)
+    expires_at = Column(Float, default=0)
+
+class RateLimitBucket(Base):
+    """Token bucket shared by worker processes (see backend/app/ratelimit.py)."""
+    __tablename__ = "rate_limit_buckets"
+    name = Column(String, primary_key=True)
+    tokens = Column(Float)
+    updated_at = Column(Float)
+
+class SearchCacheEntry(Base):
+    """Cached web search results (see backend/app/search_cache.py)."""
+    __tablename__ = "search_cache"
+    key = Column(String, primary_key=True)
+    query = Column(Text)
+    results = Column(Text)  # JSON list of {title, url, content}
+    created_at = Column(Float)
+    last_used_at = Column(Float, index=True)
+    hits = Column(Integer, default=0)
+
 # Call this ONLY after the class is defined
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,119 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .plant_registry import plant_registry
+
+# Words that say nothing about which plant is meant
+STOPWORDS = {"the", "limited", "ltd", "pvt", "private", "llp", "inc", "co", "company"}
+
+# Candidates re-scored with the token rules after the trigram pass
+CANDIDATE_POOL = 20
+# A plant whose name holds every query word is boosted only if the names
+# are this close already; otherwise any one-word query would be a "match"
+SUBSET_MIN_DICE = 0.4
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(name: str) -> str:
+    tokens = _NON_ALNUM.sub(" ", name.lower()).split()
+    kept = [t for t in tokens if t not in STOPWORDS]
+    # a name made only of stopwords still has to match itself
+    return " ".join(kept or tokens)
+
+
+def trigrams(normalized: str) -> set:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True, slots=True)
+class PlantMatch:
+    ps_id: str
+    ps_name: str
+    score: float
+
+
+class PlantIndex:
+    """
+    In-memory fuzzy search over plant names.
+    Names are normalized (case, punctuation, corporate suffixes) and split into
+    character trigrams; each trigram maps to a numpy array of plant positions,
+    so scoring a query is one bincount over its postings (Dice similarity),
+    followed by token-level boosts on the best few candidates.
+    """
+
+    def __init__(self, plants: list):
+        self.source = plants
+        # a plant without a name has nothing to match on
+        named = [p for p in plants if normalize(p.ps_name or "")]
+        self.ps_ids = [p.ps_id for p in named]
+        self.names = [p.ps_name for p in named]
+        self.normalized = [normalize(n) for n in self.names]
+        self.tokens = [set(n.split()) for n in self.normalized]
+
+        postings: dict = {}
+        sizes = np.zeros(len(named), dtype=np.float32)
+        for i, name in enumerate(self.normalized):
+            grams = trigrams(name)
+            sizes[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.trigram_counts = sizes
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self.exact = {}
+        for i, name in enumerate(self.normalized):
+            self.exact.setdefault(name, i)
+
+    def __len__(self):
+        return len(self.ps_ids)
+
+    def search(self, name: str, limit: int = 3, min_score: float = 0.3) -> list:
+        query = normalize(name)
+        if not query or not self.ps_ids:
+            return []
+
+        exact = self.exact.get(query)
+        if exact is not None and limit == 1:
+            return [PlantMatch(self.ps_ids[exact], self.names[exact], 1.0)]
+
+        grams = trigrams(query)
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.ps_ids))
+        dice = 2.0 * shared / (self.trigram_counts + len(grams))
+
+        pool = min(CANDIDATE_POOL, len(dice))
+        candidates = np.argpartition(dice, -pool)[-pool:]
+
+        query_tokens = set(query.split())
+        scored = []
+        for i in candidates:
+            i = int(i)
+            score = float(dice[i])
+            if i == exact:
+                score = 1.0
+            elif score >= SUBSET_MIN_DICE and query_tokens <= self.tokens[i]:
+                # "ovobel" vs "ovobel foods": every query word is in the name
+                score = max(score, 0.85 + 0.1 * score)
+            if score >= min_score:
+                scored.append(PlantMatch(self.ps_ids[i], self.names[i], round(score, 3)))
+
+        scored.sort(key=lambda m: m.score, reverse=True)
+        return scored[:limit]
+
+
+_index: Optional[PlantIndex] = None
+
+
+async def get_plant_index() -> PlantIndex:
+    """The index over the registry's current plant list, rebuilt only when that list changes."""
+    global _index
+    plants = await plant_registry.get_plants()
+    if _index is None or _index.source is not plants:
+        _index = PlantIndex(plants)
+    return _index
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Union
+
+from dotenv import load_dotenv
+
+from .isolarcloud import DetailBatch, ISolarCloudClient, isolarcloud, split_ps_ids
+
+load_dotenv()
+
+# The plant list changes maybe once a week:
+# fresh for PLANT_REGISTRY_TTL, then served stale (while refreshing in the
+# background) for up to PLANT_REGISTRY_MAX_STALE more seconds
+PLANT_REGISTRY_TTL = float(os.getenv("PLANT_REGISTRY_TTL", "3600"))
+PLANT_REGISTRY_MAX_STALE = float(os.getenv("PLANT_REGISTRY_MAX_STALE", "86400"))
+# After a failed background refresh, stale hits wait this long before trying
+# upstream again, doubling per consecutive failure up to the max
+PLANT_REGISTRY_RETRY_AFTER = float(os.getenv("PLANT_REGISTRY_RETRY_AFTER", "30"))
+PLANT_REGISTRY_RETRY_MAX = float(os.getenv("PLANT_REGISTRY_RETRY_MAX", "600"))
+
+# getPowerStationDetail records per ps_id. Capacity, location, install date
+# and tariff almost never change; online_status rides along, which is what
+# keeps the default TTL in minutes rather than days.
+PLANT_DETAIL_TTL = float(os.getenv("PLANT_DETAIL_TTL", "900"))
+PLANT_DETAIL_MAX_ENTRIES = int(os.getenv("PLANT_DETAIL_MAX_ENTRIES", "10000"))
+
+
+class _Entry:
+    __slots__ = ("plants", "fetched_at")
+
+    def __init__(self, plants: list, fetched_at: float):
+        self.plants = plants
+        self.fetched_at = fetched_at
+
+
+class PlantRegistry:
+    """
+    Process-wide cache of the queryPowerStationList result per account.
+    Fresh entries are served directly; stale ones are served immediately
+    while a single background task refreshes them (backing off after a
+    failed one); missing or expired ones are fetched once, with concurrent
+    callers sharing that fetch.
+    """
+
+    def __init__(
+        self,
+        client: ISolarCloudClient,
+        ttl: float = PLANT_REGISTRY_TTL,
+        max_stale: float = PLANT_REGISTRY_MAX_STALE,
+        retry_after: float = PLANT_REGISTRY_RETRY_AFTER,
+        retry_max: float = PLANT_REGISTRY_RETRY_MAX,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.retry_after = retry_after
+        self.retry_max = retry_max
+        self._entries: dict = {}
+        self._refresh_tasks: dict = {}
+        self._failures: dict = {}  # account -> (consecutive failures, monotonic time of the last)
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.skipped_refreshes = 0
+        self.last_error: Optional[str] = None
+
+    def _account(self, client: ISolarCloudClient) -> str:
+        return client.app_key or "default"
+
+    async def get_plants(self, client: Optional[ISolarCloudClient] = None) -> list:
+        client = client or self.client
+        account = self._account(client)
+        entry = self._entries.get(account)
+
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.plants
+            if age < self.ttl + self.max_stale:
+                self.stale_hits += 1
+                if self._backoff_left(account) > 0:
+                    # upstream just failed us; don't hit it (or the breaker) on every question
+                    self.skipped_refreshes += 1
+                else:
+                    self._start_refresh(account, client)
+                return entry.plants
+
+        self.misses += 1
+        return await asyncio.shield(self._start_refresh(account, client))
+
+    def _backoff_left(self, account: str) -> float:
+        failure = self._failures.get(account)
+        if failure is None:
+            return 0.0
+        count, failed_at = failure
+        delay = min(self.retry_after * 2 ** (count - 1), self.retry_max)
+        return max(failed_at + delay - time.monotonic(), 0.0)
+
+    def _start_refresh(self, account: str, client: ISolarCloudClient) -> asyncio.Task:
+        task = self._refresh_tasks.get(account)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(account, client))
+            self._refresh_tasks[account] = task
+            task.add_done_callback(lambda t: self._finish_refresh(account, t))
+        return task
+
+    async def _refresh(self, account: str, client: ISolarCloudClient) -> list:
+        plants = await client.list_all_power_stations()
+        self._entries[account] = _Entry(plants, time.monotonic())
+        self._failures.pop(account, None)
+        self.refreshes += 1
+        self.last_error = None
+        return plants
+
+    def _finish_refresh(self, account: str, task: asyncio.Task):
+        if self._refresh_tasks.get(account) is task:
+            del self._refresh_tasks[account]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            # A failed background refresh keeps serving the stale list
+            count = self._failures.get(account, (0, 0.0))[0] + 1
+            self._failures[account] = (count, time.monotonic())
+            self.refresh_failures += 1
+            self.last_error = str(error)
+            print(f"Plant registry: refresh for {account} failed: {error}")
+
+    def invalidate(self, client: Optional[ISolarCloudClient] = None):
+        account = self._account(client or self.client)
+        self._entries.pop(account, None)
+        self._failures.pop(account, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else None,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "skipped_refreshes": self.skipped_refreshes,
+            "last_error": self.last_error,
+            "accounts": {
+                account: {
+                    "plants": len(entry.plants),
+                    "age_seconds": round(now - entry.fetched_at, 1),
+                    "retry_in_seconds": round(self._backoff_left(account), 1),
+                }
+                for account, entry in self._entries.items()
+            },
+        }
+
+
+class PlantDetailCache:
+    """
+    TTL cache of getPowerStationDetail records keyed by ps_id (LRU-bounded).
+    Each call serves the cached plants and fetches only the missing IDs,
+    then merges both in the order the IDs were asked for.
+    """
+
+    def __init__(
+        self,
+        client: ISolarCloudClient,
+        ttl: float = PLANT_DETAIL_TTL,
+        max_entries: int = PLANT_DETAIL_MAX_ENTRIES,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def _get(self, ps_id: str, now: float):
+        entry = self._entries.get(ps_id)
+        if entry is None:
+            return None
+        detail, fetched_at = entry
+        if now - fetched_at >= self.ttl:
+            del self._entries[ps_id]
+            return None
+        self._entries.move_to_end(ps_id)
+        return detail
+
+    def _put(self, detail, now: float):
+        self._entries[detail.ps_id] = (detail, now)
+        self._entries.move_to_end(detail.ps_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_details(self, ps_ids: Union[str, Iterable]) -> DetailBatch:
+        ids = split_ps_ids(ps_ids)
+        now = time.monotonic()
+
+        found = {}
+        missing = []
+        for ps_id in ids:
+            detail = self._get(ps_id, now)
+            if detail is None:
+                missing.append(ps_id)
+            else:
+                found[ps_id] = detail
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        failures = []
+        if missing:
+            self.fetches += 1
+            batch = await self.client.get_power_station_details(missing)
+            now = time.monotonic()
+            for detail in batch.plants:
+                self._put(detail, now)
+                found[detail.ps_id] = detail
+            failures = batch.failures
+
+        return DetailBatch(plants=[found[i] for i in ids if i in found], failures=failures)
+
+    def invalidate(self, ps_ids: Optional[Union[str, Iterable]] = None):
+        if ps_ids is None:
+            self._entries.clear()
+            return
+        for ps_id in split_ps_ids(ps_ids):
+            self._entries.pop(ps_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "upstream_fetches": self.fetches,
+            "entries": len(self._entries),
+        }
+
+
+plant_registry = PlantRegistry(isolarcloud)
+plant_detail_cache = PlantDetailCache(isolarcloud)
@@ -0,0 +1,239 @@
+import asyncio
+import functools
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .config import parse_overrides
+from .db import SessionLocal
+from .models import RateLimitBucket, init_db
+
+load_dotenv()
+
+# Requests per second allowed per endpoint, and the burst a bucket can hold.
+# ISOLARCLOUD_RATE_LIMITS overrides single endpoints, e.g.
+# "queryPowerStationList=2,getPowerStationDetail=5"
+ISOLARCLOUD_RATE_LIMIT = float(os.getenv("ISOLARCLOUD_RATE_LIMIT", "5"))
+ISOLARCLOUD_RATE_BURST = float(os.getenv("ISOLARCLOUD_RATE_BURST", "10"))
+ISOLARCLOUD_RATE_LIMITS = os.getenv("ISOLARCLOUD_RATE_LIMITS", "")
+# Share the buckets between uvicorn workers through the local SQLite DB
+ISOLARCLOUD_RATE_LIMIT_SHARED = os.getenv("ISOLARCLOUD_RATE_LIMIT_SHARED", "false").lower() in ("1", "true", "yes")
+
+# Chat session the current task works for; set by run_chatbot, read by the
+# limiter so one chatty session cannot starve the others
+current_session: ContextVar[str] = ContextVar("current_session", default="default")
+
+
+class RateLimitError(Exception):
+    """A bucket could not be read or updated (e.g. the shared DB stayed locked)."""
+
+
+class LocalTokenBucket:
+    """Classic token bucket kept in process memory."""
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    async def take(self) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def take_shared_token(name: str, rate: float, burst: float) -> float:
+    """
+    Token bucket stored in the rate_limit_buckets table. The refill and the
+    take happen in one conditional UPDATE, so concurrent processes can never
+    both spend the last token.
+    """
+    db = SessionLocal()
+    try:
+        now = time.time()
+        if db.get(RateLimitBucket, name) is None:
+            db.add(RateLimitBucket(name=name, tokens=burst, updated_at=now))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+
+        available = func.min(burst, RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rate)
+        taken = db.query(RateLimitBucket).filter(
+            RateLimitBucket.name == name, available >= 1
+        ).update({"tokens": available - 1, "updated_at": now}, synchronize_session=False)
+        db.commit()
+        if taken:
+            return 0.0
+
+        bucket = db.get(RateLimitBucket, name)
+        tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+        return max((1 - tokens) / rate, 0.001)
+    finally:
+        db.close()
+
+
+class SharedTokenBucket:
+    """Token bucket shared by every process using the same SQLite DB."""
+
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratelimit-db")
+    _db_ready = False
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    async def take(self) -> float:
+        loop = asyncio.get_running_loop()
+        if not SharedTokenBucket._db_ready:
+            await loop.run_in_executor(self._executor, init_db)
+            SharedTokenBucket._db_ready = True
+        return await loop.run_in_executor(
+            self._executor, functools.partial(take_shared_token, self.name, self.rate, self.burst)
+        )
+
+
+class _EndpointQueue:
+    """Waiters of one endpoint, grouped by session and served round-robin."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.sessions: OrderedDict = OrderedDict()
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self.sessions.values())
+
+    def next_waiter(self) -> Optional[asyncio.Future]:
+        while self.sessions:
+            session, waiters = next(iter(self.sessions.items()))
+            fut = waiters.popleft()
+            if waiters:
+                # this session goes to the back of the line
+                self.sessions.move_to_end(session)
+            else:
+                del self.sessions[session]
+            if not fut.done():
+                return fut
+        return None
+
+
+class RateLimiter:
+    """
+    Client-side limiter for the iSolarCloud appkey quota: one token bucket per
+    endpoint, shared by every call. When a bucket is empty, callers queue and
+    tokens are handed out round-robin across chat sessions.
+    """
+
+    def __init__(
+        self,
+        rate: float = ISOLARCLOUD_RATE_LIMIT,
+        burst: float = ISOLARCLOUD_RATE_BURST,
+        overrides: Optional[dict] = None,
+        shared: bool = ISOLARCLOUD_RATE_LIMIT_SHARED,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides if overrides is not None else parse_overrides(ISOLARCLOUD_RATE_LIMITS)
+        self.shared = shared
+        self._queues: dict = {}
+
+    def _queue(self, endpoint: str) -> _EndpointQueue:
+        queue = self._queues.get(endpoint)
+        if queue is None:
+            name = endpoint.rsplit("/", 1)[-1]
+            rate = self.overrides.get(name, self.rate)
+            bucket_cls = SharedTokenBucket if self.shared else LocalTokenBucket
+            queue = _EndpointQueue(bucket_cls(f"isolarcloud:{name}", rate, max(self.burst, 1)))
+            self._queues[endpoint] = queue
+        return queue
+
+    async def acquire(self, endpoint: str, session: Optional[str] = None):
+        queue = self._queue(endpoint)
+        # fast path: nobody is waiting and a token is available
+        if not queue.sessions and await self._take(queue) == 0:
+            queue.granted += 1
+            return
+
+        started = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        queue.sessions.setdefault(session or current_session.get(), deque()).append(fut)
+        if queue.dispatcher is None or queue.dispatcher.done():
+            queue.dispatcher = asyncio.ensure_future(self._dispatch(queue))
+
+        await fut  # a cancelled waiter is skipped by next_waiter()
+        queue.granted += 1
+        queue.delayed += 1
+        queue.wait_seconds += time.monotonic() - started
+
+    async def try_acquire(self, endpoint: str) -> bool:
+        """Take a token only if one is free right now; never queues."""
+        queue = self._queue(endpoint)
+        try:
+            if queue.sessions or await self._take(queue) > 0:
+                return False
+        except RateLimitError:
+            return False  # an optional request; just don't send it
+        queue.granted += 1
+        return True
+
+    async def _take(self, queue: _EndpointQueue) -> float:
+        try:
+            return await queue.bucket.take()
+        except Exception as e:
+            # SQLAlchemy appends the SQL and a docs link; the first line is the cause
+            detail = str(e).splitlines()[0] if str(e) else ""
+            raise RateLimitError(f"rate limit bucket {queue.bucket.name} unavailable: {type(e).__name__} {detail}".strip()) from e
+
+    async def _dispatch(self, queue: _EndpointQueue):
+        try:
+            while queue.sessions:
+                wait = await self._take(queue)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                fut = queue.next_waiter()
+                if fut is None:
+                    # every remaining waiter was cancelled; the token is lost,
+                    # which only makes us slightly more conservative
+                    break
+                fut.set_result(None)
+        except RateLimitError as e:
+            # fail the queued calls now rather than leave them hanging until
+            # some later call starts a new dispatcher
+            print(f"Rate limiter: {e}; failing {queue.waiting()} queued calls")
+            while (fut := queue.next_waiter()) is not None:
+                fut.set_exception(RateLimitError(str(e)))
+
+    def stats(self) -> dict:
+        return {
+            endpoint.rsplit("/", 1)[-1]: {
+                "rate": queue.bucket.rate,
+                "burst": queue.bucket.burst,
+                "shared": self.shared,
+                "granted": queue.granted,
+                "delayed": queue.delayed,
+                "avg_wait_ms": round(queue.wait_seconds / queue.delayed * 1000, 1) if queue.delayed else 0.0,
+                "waiting": queue.waiting(),
+                "waiting_sessions": len(queue.sessions),
+            }
+            for endpoint, queue in self._queues.items()
+        }
@@ -0,0 +1,36 @@
+import asyncio
+import random
+from typing import Awaitable, Callable
+
+
+class Retry(Exception):
+    """Raised by an attempt that may be tried again; `error` is raised if none are left."""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff capped at `cap`, with +-50% jitter so clients don't retry in step."""
+    return min(base * 2 ** attempt, cap) * random.uniform(0.5, 1.5)
+
+
+async def with_retries(
+    attempt: Callable[[], Awaitable],
+    max_retries: int,
+    backoff_base: float,
+    backoff_max: float,
+):
+    """
+    Await attempt() up to max_retries + 1 times. An attempt raises Retry to
+    ask for another try; any other exception, or a return, ends the loop.
+    """
+    for n in range(max_retries + 1):
+        try:
+            return await attempt()
+        except Retry as r:
+            error = r.error
+        if n < max_retries:
+            await asyncio.sleep(backoff_delay(n, backoff_base, backoff_max))
+    raise error
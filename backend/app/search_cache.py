@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+
+from .db import SessionLocal
+from .models import SearchCacheEntry, init_db
+
+load_dotenv()
+
+# Web results go stale slowly; a day keeps repeated questions off the paid API
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "86400"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+# Filler words only: question words (how, what, why, ...) and negations
+# change what is being asked, so they stay part of the key
+STOPWORDS = frozenset("""
+    a an and are as at be by for from i in is it me my of on or please
+    show tell that the this to was will with
+""".split())
+
+
+def normalize_query(query: str) -> str:
+    """'What is  Solar-Panel efficiency in 2024?' -> 'solar panel efficiency 2024'"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    words = re.sub(r"[^\w]+", " ", text).split()
+    kept = [w for w in words if w not in STOPWORDS]
+    # a query made only of stopwords still needs a key
+    return " ".join(kept or words)
+
+
+class SearchCache:
+    """
+    Persistent TTL cache of search results in the local SQLite DB, keyed on
+    the normalized query. Past max_entries the least recently used rows are
+    evicted. Synchronous: call it from a worker thread, not the event loop.
+    """
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._ready = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _init(self):
+        if not self._ready:
+            # create_all is check-then-create; two threads racing it fail
+            with self._lock:
+                if not self._ready:
+                    init_db()
+                    self._ready = True
+
+    def key(self, query: str, max_results: int) -> str:
+        return f"{max_results}:{normalize_query(query)}"
+
+    def get(self, query: str, max_results: int) -> Optional[list]:
+        self._init()
+        key = self.key(query, max_results)
+        db = SessionLocal()
+        try:
+            now = time.time()
+            entry = db.get(SearchCacheEntry, key)
+            if entry is not None and now - entry.created_at >= self.ttl:
+                db.delete(entry)
+                db.commit()
+                entry = None
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            entry.last_used_at = now
+            entry.hits = (entry.hits or 0) + 1
+            results = json.loads(entry.results)
+            db.commit()
+            with self._lock:
+                self.hits += 1
+            return results
+        finally:
+            db.close()
+
+    def put(self, query: str, max_results: int, results: list):
+        self._init()
+        db = SessionLocal()
+        try:
+            now = time.time()
+            db.merge(SearchCacheEntry(
+                key=self.key(query, max_results),
+                query=query,
+                results=json.dumps(results),
+                created_at=now,
+                last_used_at=now,
+                hits=0,
+            ))
+            db.commit()
+
+            excess = db.query(func.count(SearchCacheEntry.key)).scalar() - self.max_entries
+            if excess > 0:
+                oldest = db.query(SearchCacheEntry.key).order_by(SearchCacheEntry.last_used_at).limit(excess)
+                evicted = db.query(SearchCacheEntry).filter(
+                    SearchCacheEntry.key.in_(oldest.scalar_subquery())
+                ).delete(synchronize_session=False)
+                db.commit()
+                with self._lock:
+                    self.evictions += evicted
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        self._init()
+        db = SessionLocal()
+        try:
+            entries = db.query(func.count(SearchCacheEntry.key)).scalar()
+        finally:
+            db.close()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "entries": entries,
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+        }
+
+
+search_cache = SearchCache()
@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+
+
+class SessionBusyError(Exception):
+    """Raised when a session already has a turn running; the message is sent to the client as is."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        super().__init__("A turn is already running for this session.")
+
+
+class SessionTurns:
+    """
+    One turn at a time per session, whichever way it arrives (/chat,
+    /chat/stream or the WebSocket): two turns on the same thread would
+    interleave their checkpoints. Per process, like the graph itself.
+    """
+
+    def __init__(self):
+        self.active: set = set()
+        self.rejected = 0
+
+    def busy(self, session_id: str) -> bool:
+        return session_id in self.active
+
+    @contextmanager
+    def hold(self, session_id: str):
+        # check and claim with no await between them, so two callers can't both pass
+        if session_id in self.active:
+            self.rejected += 1
+            raise SessionBusyError(session_id)
+        self.active.add(session_id)
+        try:
+            yield
+        finally:
+            self.active.discard(session_id)
+
+    def stats(self) -> dict:
+        return {"active_sessions": sorted(self.active), "rejected": self.rejected}
+
+
+session_turns = SessionTurns()
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the
+    call, every caller that arrives while it is in flight awaits the same
+    result (or exception). Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self._counts: dict = {}
+
+    async def do(self, key, fn: Callable[[], Awaitable], label: str = "default"):
+        counts = self._counts.setdefault(label, {"issued": 0, "coalesced": 0})
+        key = (label, key)
+
+        task = self._calls.get(key)
+        if task is None:
+            counts["issued"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            counts["coalesced"] += 1
+
+        # shield: one caller giving up must not cancel the call the others share
+        return await asyncio.shield(task)
+
+    def _done(self, key, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # mark the exception retrieved even if every waiter was cancelled
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            label: {**counts, "in_flight": sum(1 for k in self._calls if k[0] == label)}
+            for label, counts in self._counts.items()
+        }
@@ -0,0 +1,137 @@
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .isolarcloud import split_ps_ids
+from .plant_registry import PlantDetailCache, PlantRegistry, plant_detail_cache, plant_registry
+from .weather import WeatherClient, weather_client
+
+load_dotenv()
+
+# Simple PV model: energy = capacity * irradiance / 1000 W/m2 * PR * temperature derate.
+# PR folds in inverter, wiring, soiling and mismatch losses; no tilt/azimuth
+# data comes from iSolarCloud, so horizontal irradiance stands in for
+# plane-of-array irradiance.
+YIELD_PERFORMANCE_RATIO = float(os.getenv("YIELD_PERFORMANCE_RATIO", "0.8"))
+YIELD_TEMP_COEFFICIENT = float(os.getenv("YIELD_TEMP_COEFFICIENT", "-0.004"))  # per C above 25 C
+YIELD_NOCT = float(os.getenv("YIELD_NOCT", "45"))  # nominal operating cell temperature, C
+
+# shortwave_radiation (GHI) drives the model; direct + diffuse fill its gaps
+YIELD_VARIABLES = ("shortwave_radiation", "direct_radiation", "diffuse_radiation", "cloud_cover", "temperature_2m")
+
+
+def expected_energy_kwh(
+    capacity_kw: np.ndarray,
+    irradiance: np.ndarray,
+    air_temperature: np.ndarray,
+    performance_ratio: float = YIELD_PERFORMANCE_RATIO,
+    temp_coefficient: float = YIELD_TEMP_COEFFICIENT,
+    noct: float = YIELD_NOCT,
+) -> np.ndarray:
+    """
+    Expected energy per plant per hour, in kWh. capacity_kw is (plants,),
+    irradiance (W/m2, mean over the hour) and air_temperature (C) are
+    (plants, hours). Everything is broadcast in one pass over the fleet.
+    """
+    irradiance = np.clip(irradiance, 0, None)
+    # NOCT cell-temperature model: the cell runs hotter the more sun it gets
+    cell_temperature = air_temperature + (noct - 20) / 800 * irradiance
+    derate = 1 + temp_coefficient * (cell_temperature - 25)
+    return capacity_kw[:, None] * (irradiance / 1000) * performance_ratio * np.clip(derate, 0, None)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class YieldForecast:
+    """Hourly expected energy for the plants that could be modelled."""
+    plants: list  # PlantDetail, aligned with the array rows
+    hourly_time: np.ndarray  # unix seconds, end of each hour
+    energy_kwh: np.ndarray  # (plants, hours)
+    cloud_cover: np.ndarray  # (plants, hours), %
+    skipped: dict  # ps_id -> reason
+
+    @property
+    def total_kwh(self) -> np.ndarray:
+        return self.energy_kwh.sum(axis=1)
+
+    @property
+    def peak_hour(self) -> np.ndarray:
+        """Index of the most productive hour for each plant."""
+        return self.energy_kwh.argmax(axis=1)
+
+
+class YieldForecaster:
+    """
+    Joins plant capacity (getPowerStationDetail), coordinates
+    (queryPowerStationList) and Open-Meteo irradiance, then runs the PV
+    model for the whole fleet at once.
+    """
+
+    def __init__(
+        self,
+        registry: PlantRegistry = plant_registry,
+        details: PlantDetailCache = plant_detail_cache,
+        weather: WeatherClient = weather_client,
+    ):
+        self.registry = registry
+        self.details = details
+        self.weather = weather
+
+    async def forecast(self, ps_ids: Optional[Union[str, Iterable]] = None, hours: int = 24) -> YieldForecast:
+        """Forecast the next `hours` hours for ps_ids, or for every plant when empty."""
+        summaries = {p.ps_id: p for p in await self.registry.get_plants()}
+        ids = split_ps_ids(ps_ids) if ps_ids else list(summaries)
+
+        skipped = {}
+        located = []
+        for ps_id in ids:
+            summary = summaries.get(ps_id)
+            if summary is None:
+                skipped[ps_id] = "not in this account"
+            elif summary.coordinates is None:
+                skipped[ps_id] = "no coordinates"
+            else:
+                located.append(ps_id)
+
+        batch = await self.details.get_details(located) if located else None
+        plants = []
+        for detail in batch.plants if batch else []:
+            if detail.capacity_kw:
+                plants.append(detail)
+            else:
+                skipped[detail.ps_id] = "installed capacity unknown"
+        for failure in batch.failures if batch else []:
+            for ps_id in failure.ps_ids:
+                skipped[ps_id] = failure.error
+
+        if not plants:
+            empty = np.empty((0, 0))
+            return YieldForecast([], np.empty(0, dtype=np.int64), empty, empty, skipped)
+
+        fleet = await self.weather.get_fleet_forecast(
+            [summaries[p.ps_id].coordinates for p in plants], hourly=YIELD_VARIABLES
+        )
+        # radiation values are the mean over the preceding hour, so the first
+        # useful step is the one ending after now
+        start = fleet.hour_index() + 1
+        window = slice(start, start + hours)
+        ghi = fleet.hourly["shortwave_radiation"][:, window]
+        fallback = fleet.hourly["direct_radiation"][:, window] + fleet.hourly["diffuse_radiation"][:, window]
+        irradiance = np.where(np.isnan(ghi), fallback, ghi)
+        irradiance = np.nan_to_num(irradiance, nan=0.0)
+
+        capacity = np.array([p.capacity_kw for p in plants], dtype=np.float64)
+        temperature = np.nan_to_num(fleet.hourly["temperature_2m"][:, window], nan=25.0)
+        energy = expected_energy_kwh(capacity, irradiance, temperature)
+        return YieldForecast(
+            plants=plants,
+            hourly_time=fleet.hourly_time[window],
+            energy_kwh=energy,
+            cloud_cover=fleet.hourly["cloud_cover"][:, window],
+            skipped=skipped,
+        )
+
+
+yield_forecaster = YieldForecaster()
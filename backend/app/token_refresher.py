@@ -0,0 +1,109 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .helper import TOKEN_EXPIRY_SKEW, TokenCache, token_cache
+
+load_dotenv()
+
+# Renew the token this many seconds before expires_at
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+# Upper bound on how long the refresher sleeps between checks
+TOKEN_REFRESH_CHECK_INTERVAL = int(os.getenv("TOKEN_REFRESH_CHECK_INTERVAL", "60"))
+# Retry backoff after a failed refresh: base * 2^(n-1), capped, with jitter
+TOKEN_REFRESH_RETRY_BASE = float(os.getenv("TOKEN_REFRESH_RETRY_BASE", "5"))
+TOKEN_REFRESH_RETRY_MAX = float(os.getenv("TOKEN_REFRESH_RETRY_MAX", "300"))
+
+
+class TokenRefresher:
+    """
+    Background task that renews the access token a margin before it expires,
+    so requests never have to wait on the refresh endpoint themselves.
+    """
+
+    def __init__(
+        self,
+        cache: TokenCache,
+        margin: int = TOKEN_REFRESH_MARGIN,
+        check_interval: int = TOKEN_REFRESH_CHECK_INTERVAL,
+        retry_base: float = TOKEN_REFRESH_RETRY_BASE,
+        retry_max: float = TOKEN_REFRESH_RETRY_MAX,
+    ):
+        self.cache = cache
+        # Below the cache's own skew the request path would refresh first
+        self.margin = max(margin, TOKEN_EXPIRY_SKEW + 1)
+        self.check_interval = check_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.failure_count = 0
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def seconds_until_due(self) -> float:
+        if self.cache.expires_at is None:
+            return float(self.check_interval)
+        return self.cache.expires_at - self.margin - time.time()
+
+    def retry_delay(self) -> float:
+        delay = min(self.retry_base * 2 ** (self.consecutive_failures - 1), self.retry_max)
+        return delay * random.uniform(0.5, 1.5)
+
+    async def run(self):
+        while True:
+            try:
+                # Loads the stored token on first run so we know when it expires
+                await self.cache.get()
+                due_in = self.seconds_until_due()
+                if self.cache.expires_at is None or due_in > 0:
+                    await asyncio.sleep(min(max(due_in, 0), self.check_interval))
+                    continue
+
+                await self.cache.refresh()
+                self.last_refresh_at = time.time()
+                self.last_error = None
+                self.consecutive_failures = 0
+                print("Token refresher: access token renewed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failure_count += 1
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+                delay = self.retry_delay()
+                print(f"Token refresher: refresh failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "expires_at": self.cache.expires_at,
+            "refresh_margin": self.margin,
+            "last_refresh_at": self.last_refresh_at,
+            "failure_count": self.failure_count,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+token_refresher = TokenRefresher(token_cache)
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from .config import parse_overrides
+
+load_dotenv()
+
+# Per-tool caps and timeouts, "name=value, ...". Only the tools named in
+# either list are bounded; the iSolarCloud tools are left to the client's
+# own rate limiter, retries and timeouts, which a cap here would queue
+# behind and a timeout would cut short
+TOOL_CONCURRENCY = os.getenv("TOOL_CONCURRENCY", "search_web=4")
+TOOL_TIMEOUTS = os.getenv("TOOL_TIMEOUTS", "search_web=30")
+# Fill-ins for a tool named in only one of the lists
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+
+
+class _ToolSlot:
+    """Concurrency cap and counters of one tool."""
+
+    def __init__(self, limit: int, timeout: float):
+        self.limit = limit
+        self.timeout = timeout
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.finished = 0
+
+
+class ToolExecutor:
+    """
+    Bounds the tools named in its config: each gets its own concurrency
+    cap, so one slow tool can hold at most `limit` calls, and its own
+    timeout covering queueing and running. Other tools run untouched.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        timeout: float = TOOL_TIMEOUT,
+        concurrency: Optional[dict] = None,
+        timeouts: Optional[dict] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.concurrency = concurrency if concurrency is not None else parse_overrides(TOOL_CONCURRENCY)
+        self.timeouts = timeouts if timeouts is not None else parse_overrides(TOOL_TIMEOUTS)
+        self._slots: dict = {}
+
+    def bounds(self, name: str) -> bool:
+        return name in self.concurrency or name in self.timeouts
+
+    def _slot(self, name: str) -> _ToolSlot:
+        slot = self._slots.get(name)
+        if slot is None:
+            limit = int(self.concurrency.get(name, self.max_concurrency))
+            slot = _ToolSlot(limit, self.timeouts.get(name, self.timeout))
+            self._slots[name] = slot
+        return slot
+
+    async def _acquire(self, slot: _ToolSlot) -> Optional[float]:
+        """Wait for a slot; seconds waited, or None if the timeout ran out first."""
+        if slot.semaphore is None:
+            slot.semaphore = asyncio.Semaphore(slot.limit)
+        slot.calls += 1
+        slot.waiting += 1
+        queued_at = time.monotonic()
+        # the timeout covers queueing and running together
+        try:
+            await asyncio.wait_for(slot.semaphore.acquire(), slot.timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            slot.waiting -= 1
+        waited = time.monotonic() - queued_at
+        slot.wait_seconds += waited
+        slot.max_wait_seconds = max(slot.max_wait_seconds, waited)
+        slot.running += 1
+        return waited
+
+    def _release(self, slot: _ToolSlot, started: float):
+        slot.running -= 1
+        slot.finished += 1
+        slot.run_seconds += time.monotonic() - started
+        slot.semaphore.release()
+
+    async def run(self, name: str, coroutine: Callable, *args, **kwargs):
+        """Await an async tool function under its cap and timeout."""
+        slot = self._slot(name)
+        waited = await self._acquire(slot)
+        if waited is None:
+            return self._timed_out(name, slot)
+
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(coroutine(*args, **kwargs), max(slot.timeout - waited, 0))
+        except asyncio.TimeoutError:
+            return self._timed_out(name, slot)
+        except Exception:
+            slot.errors += 1
+            raise
+        finally:
+            self._release(slot, started)
+
+    def _timed_out(self, name: str, slot: _ToolSlot) -> str:
+        slot.timeouts += 1
+        print(f"Tool executor: {name} timed out after {slot.timeout:g}s")
+        return f"Error: {name} did not answer within {slot.timeout:g} seconds. Try again later."
+
+    def offload(self, tool):
+        """
+        Put an async LangChain tool's coroutine under this executor when the
+        tool is named in the config; any other tool is returned unchanged.
+        """
+        coroutine = getattr(tool, "coroutine", None)
+        if coroutine is None or not self.bounds(tool.name):
+            return tool
+        name = tool.name
+
+        async def run_capped(*args, **kwargs):
+            return await self.run(name, coroutine, *args, **kwargs)
+
+        tool.coroutine = run_capped
+        return tool
+
+    def stats(self) -> dict:
+        return {
+            "tools": {
+                name: {
+                    "limit": slot.limit,
+                    "timeout_seconds": slot.timeout,
+                    "queue_depth": slot.waiting,
+                    "running": slot.running,
+                    "calls": slot.calls,
+                    "timeouts": slot.timeouts,
+                    "errors": slot.errors,
+                    "avg_wait_ms": round(slot.wait_seconds / slot.calls * 1000, 1) if slot.calls else 0.0,
+                    "max_wait_ms": round(slot.max_wait_seconds * 1000, 1),
+                    "avg_run_ms": round(slot.run_seconds / slot.finished * 1000, 1) if slot.finished else 0.0,
+                }
+                for name, slot in self._slots.items()
+            },
+        }
+
+
+tool_executor = ToolExecutor()
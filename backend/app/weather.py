@@ -0,0 +1,303 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+from .http_client import get_http_client
+from .retry import Retry, with_retries
+from .singleflight import SingleFlight
+
+load_dotenv()
+
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Coordinates are snapped to a grid of WEATHER_GRID degrees before the
+# lookup: the forecast models are ~0.1 deg wide, so plants a few km apart
+# share one cached forecast
+WEATHER_GRID = float(os.getenv("WEATHER_GRID", "0.1"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "3600"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "5000"))
+# 8 days so a full week ahead of "now" is always covered
+WEATHER_FORECAST_DAYS = int(os.getenv("WEATHER_FORECAST_DAYS", "8"))
+# Grid cells per Open-Meteo request when fetching many locations at once
+WEATHER_BATCH_SIZE = int(os.getenv("WEATHER_BATCH_SIZE", "100"))
+
+# Retries for transient failures (5xx, 429, timeouts, dropped connections)
+WEATHER_MAX_RETRIES = int(os.getenv("WEATHER_MAX_RETRIES", "2"))
+WEATHER_BACKOFF_BASE = float(os.getenv("WEATHER_BACKOFF_BASE", "0.5"))
+WEATHER_BACKOFF_MAX = float(os.getenv("WEATHER_BACKOFF_MAX", "4"))
+
+HOURLY_VARIABLES = ("temperature_2m", "precipitation", "wind_speed_10m")
+CURRENT_VARIABLES = ("temperature_2m", "relative_humidity_2m")
+
+
+class WeatherError(Exception):
+    """Open-Meteo request or decode failure, worded for the chat reply."""
+
+
+def snap(value: float, grid: float = WEATHER_GRID) -> float:
+    """12.9716 -> 13.0 on a 0.1 grid; rounded so float noise can't split a cell."""
+    return round(round(value / grid) * grid, 6)
+
+
+def current_hour(now: Optional[float] = None) -> int:
+    """Start of the current UTC hour, as a unix timestamp."""
+    now = time.time() if now is None else now
+    return int(now // 3600 * 3600)
+
+
+def decode_responses(content: bytes) -> list:
+    """
+    Open-Meteo's FlatBuffers body: one length-prefixed WeatherApiResponse per
+    location, in the order the coordinates were sent.
+    """
+    messages = []
+    pos = 0
+    while pos < len(content):
+        length = int.from_bytes(content[pos:pos + 4], byteorder="little")
+        # an error mid-stream is plain text starting with "Unexpected"
+        if length == 0x78656E55:
+            raise WeatherError(f"Error fetching weather : {content[pos:].decode('utf-8', 'replace')}")
+        messages.append(WeatherApiResponse.GetRootAs(content, pos + 4))
+        pos += length + 4
+    return messages
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class WeatherForecast:
+    """One Open-Meteo forecast for a grid cell; hourly series as numpy arrays."""
+    latitude: float
+    longitude: float
+    current_time: int  # unix seconds
+    current: dict
+    hourly_time: np.ndarray  # unix seconds, int64
+    hourly: dict  # variable -> float32 array aligned with hourly_time
+
+    @classmethod
+    def from_flatbuffer(cls, message: WeatherApiResponse, hourly: Iterable, current: Iterable) -> "WeatherForecast":
+        # variables come back in the order they were requested
+        series = message.Hourly()
+        now = message.Current()
+        return cls(
+            latitude=message.Latitude(),
+            longitude=message.Longitude(),
+            current_time=now.Time(),
+            current={name: now.Variables(i).Value() for i, name in enumerate(current)},
+            hourly_time=np.arange(series.Time(), series.TimeEnd(), series.Interval(), dtype=np.int64),
+            hourly={name: series.Variables(i).ValuesAsNumpy() for i, name in enumerate(hourly)},
+        )
+
+    def hour_index(self, at: Optional[float] = None) -> int:
+        """Index of the first hourly step at or after the hour containing `at`."""
+        return int(np.searchsorted(self.hourly_time, current_hour(at)))
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class FleetWeather:
+    """
+    Forecasts for many locations as one array per variable, shape
+    (locations, hours). Locations that fall in the same grid cell share the
+    underlying forecast; `cells` is how many distinct cells there were.
+    """
+    hourly_time: np.ndarray
+    hourly: dict  # variable -> (locations, hours)
+    current: dict  # variable -> (locations,)
+    cells: int
+
+    def hour_index(self, at: Optional[float] = None) -> int:
+        return int(np.searchsorted(self.hourly_time, current_hour(at)))
+
+
+class WeatherClient:
+    """
+    Async Open-Meteo client. Forecasts are cached per (grid cell, forecast
+    hour, variables): a new UTC hour or WEATHER_CACHE_TTL expires an entry,
+    and concurrent misses for the same cell share one upstream request.
+    """
+
+    def __init__(
+        self,
+        url: str = OPEN_METEO_URL,
+        grid: float = WEATHER_GRID,
+        ttl: float = WEATHER_CACHE_TTL,
+        max_entries: int = WEATHER_CACHE_MAX_ENTRIES,
+        forecast_days: int = WEATHER_FORECAST_DAYS,
+        batch_size: int = WEATHER_BATCH_SIZE,
+        max_retries: int = WEATHER_MAX_RETRIES,
+        backoff_base: float = WEATHER_BACKOFF_BASE,
+        backoff_max: float = WEATHER_BACKOFF_MAX,
+    ):
+        self.url = url
+        self.grid = grid
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.forecast_days = forecast_days
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.single_flight = SingleFlight()
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def cache_key(self, latitude: float, longitude: float, hourly: tuple = HOURLY_VARIABLES) -> tuple:
+        return (snap(latitude, self.grid), snap(longitude, self.grid), current_hour(), tuple(hourly))
+
+    def _get(self, key: tuple, now: float) -> Optional[WeatherForecast]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        forecast, fetched_at = entry
+        if now - fetched_at >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return forecast
+
+    def _put(self, key: tuple, forecast: WeatherForecast):
+        self._entries[key] = (forecast, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_forecast(
+        self, latitude: float, longitude: float, hourly: tuple = HOURLY_VARIABLES
+    ) -> WeatherForecast:
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise WeatherError(f"Invalid coordinates: {latitude}, {longitude}")
+
+        key = self.cache_key(latitude, longitude, hourly)
+        forecast = self._get(key, time.monotonic())
+        if forecast is not None:
+            self.hits += 1
+            return forecast
+
+        self.misses += 1
+        return await self.single_flight.do(key, lambda: self._fetch_single(key), label="forecast")
+
+    async def get_fleet_forecast(self, coordinates: Iterable, hourly: tuple = HOURLY_VARIABLES) -> FleetWeather:
+        """
+        Forecasts for many (latitude, longitude) pairs. Coordinates are snapped
+        and deduplicated on the grid, cached cells are reused, and the rest
+        are fetched WEATHER_BATCH_SIZE cells per request.
+        """
+        coords = np.asarray(list(coordinates), dtype=np.float64).reshape(-1, 2)
+        if len(coords) == 0:
+            return FleetWeather(np.empty(0, dtype=np.int64), {v: np.empty((0, 0)) for v in hourly}, {}, 0)
+        if not (np.all(np.abs(coords[:, 0]) <= 90) and np.all(np.abs(coords[:, 1]) <= 180)):
+            raise WeatherError("Invalid coordinates in the fleet")
+
+        snapped = np.round(np.round(coords / self.grid) * self.grid, 6)
+        cells, location_cell = np.unique(snapped, axis=0, return_inverse=True)
+        keys = [self.cache_key(lat, lon, hourly) for lat, lon in cells]
+
+        now = time.monotonic()
+        forecasts = [self._get(key, now) for key in keys]
+        missing = [i for i, f in enumerate(forecasts) if f is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch([keys[i] for i in batch]) for batch in batches))
+        for batch, fetched in zip(batches, results):
+            for i, forecast in zip(batch, fetched):
+                forecasts[i] = forecast
+
+        # every cell shares the UTC hourly axis; trim to the shortest just in case
+        hours = min(len(f.hourly_time) for f in forecasts)
+        location_cell = location_cell.reshape(-1)
+        try:
+            return FleetWeather(
+                hourly_time=forecasts[0].hourly_time[:hours],
+                hourly={v: np.stack([f.hourly[v][:hours] for f in forecasts])[location_cell] for v in hourly},
+                current={v: np.array([f.current[v] for f in forecasts])[location_cell] for v in CURRENT_VARIABLES},
+                cells=len(keys),
+            )
+        except (KeyError, ValueError, IndexError) as e:
+            # a cell missing a variable or returning a ragged series
+            raise WeatherError(f"Error fetching weather : inconsistent forecasts ({type(e).__name__} {e})") from e
+
+    async def _fetch_single(self, key: tuple) -> WeatherForecast:
+        return (await self._fetch([key]))[0]
+
+    async def _fetch(self, keys: list) -> list:
+        """One Open-Meteo request for every cell in `keys`; results are cached."""
+        hourly = keys[0][3]
+        params = {
+            "latitude": ",".join(str(k[0]) for k in keys),
+            "longitude": ",".join(str(k[1]) for k in keys),
+            "hourly": ",".join(hourly),
+            "current": ",".join(CURRENT_VARIABLES),
+            "forecast_days": self.forecast_days,
+            "format": "flatbuffers",
+        }
+        try:
+            content = await self._send(params)
+            try:
+                messages = decode_responses(content)
+                forecasts = [WeatherForecast.from_flatbuffer(m, hourly, CURRENT_VARIABLES) for m in messages]
+            except WeatherError:
+                raise
+            except Exception as e:
+                # truncated or garbled FlatBuffers surface as struct/index errors
+                raise WeatherError(
+                    f"Error fetching weather : could not decode response ({type(e).__name__} {e})".strip()
+                ) from e
+            if len(forecasts) != len(keys):
+                raise WeatherError(f"Error fetching weather : expected {len(keys)} locations, got {len(forecasts)}")
+        except WeatherError as e:
+            self.failures += 1
+            self.last_error = str(e)
+            raise
+
+        for key, forecast in zip(keys, forecasts):
+            self._put(key, forecast)
+        return forecasts
+
+    async def _send(self, params: dict) -> bytes:
+        async def attempt() -> bytes:
+            self.upstream_calls += 1
+            try:
+                response = await get_http_client().get(self.url, params=params)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                raise Retry(WeatherError(f"Error fetching weather : {type(e).__name__} {e}".strip())) from e
+            if response.status_code >= 500 or response.status_code == 429:
+                raise Retry(WeatherError(f"Error fetching weather : HTTP {response.status_code}"))
+            if response.status_code >= 400:
+                try:
+                    reason = response.json().get("reason")
+                except (ValueError, AttributeError):
+                    reason = response.text
+                raise WeatherError(f"Error fetching weather : {reason}")
+            return response.content
+
+        return await with_retries(attempt, self.max_retries, self.backoff_base, self.backoff_max)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "grid_degrees": self.grid,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.single_flight.stats().get("forecast", {}).get("coalesced", 0),
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "entries": len(self._entries),
+        }
+
+
+weather_client = WeatherClient()
@@ -0,0 +1,177 @@
+import asyncio
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+
+from .search_cache import normalize_query, search_cache
+from .singleflight import SingleFlight
+
+load_dotenv()
+
+# Results fetched per query (one Tavily credit either way) and kept after
+# deduplication; a domain may appear at most SEARCH_MAX_PER_DOMAIN times
+SEARCH_FETCH_RESULTS = int(os.getenv("SEARCH_FETCH_RESULTS", "8"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "5"))
+SEARCH_MAX_PER_DOMAIN = int(os.getenv("SEARCH_MAX_PER_DOMAIN", "1"))
+# Snippet budget in (estimated) model tokens
+SEARCH_SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "80"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "15"))
+
+# Query parameters dropped from result URLs: these names exactly, plus any
+# utm_* campaign tag (so ?reference= or ?refresh= survive)
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"})
+TRACKING_PREFIX = "utm_"
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class SearchError(Exception):
+    """A Tavily search that failed or timed out; search_web returns its text in place of results."""
+
+
+#                           -- Result shaping --
+
+def canonical_url(url: str) -> str:
+    """'https://WWW.Example.com/a/?utm_source=x&b=1#top' -> 'https://example.com/a?b=1'"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIX)
+    )
+    path = parts.path.rstrip("/") or ""
+    return urlunsplit((parts.scheme.lower() or "https", host, path, urlencode(query), ""))
+
+
+def domain(url: str) -> str:
+    return urlsplit(url).netloc.lower().removeprefix("www.")
+
+
+def estimate_tokens(word: str) -> int:
+    # BPE vocabularies cover common words whole; long or rare ones split
+    # into roughly 4-character pieces
+    return max(1, math.ceil(len(word) / 4)) if len(word) > 6 else 1
+
+
+def truncate_tokens(text: str, max_tokens: int = SEARCH_SNIPPET_TOKENS) -> str:
+    """
+    Cut text to about max_tokens model tokens, preferring to end on a
+    sentence boundary when one falls in the last third of the budget.
+    """
+    text = " ".join(text.split())
+    used = 0
+    for match in _TOKEN.finditer(text):
+        used += estimate_tokens(match.group())
+        if used > max_tokens:
+            cut = text[:match.start()].rstrip()
+            sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+            if sentence_end > len(cut) * 2 / 3:
+                return cut[:sentence_end + 1]
+            return cut + " …"
+    return text
+
+
+def dedupe_results(
+    results: list,
+    limit: int = SEARCH_MAX_RESULTS,
+    per_domain: int = SEARCH_MAX_PER_DOMAIN,
+    seen_urls: Optional[set] = None,
+) -> list:
+    """
+    Keep the best-ranked result per canonical URL, at most per_domain per
+    site. Pass the same seen_urls set to dedupe across several queries.
+    """
+    seen_urls = set() if seen_urls is None else seen_urls
+    per_site: dict = {}
+    kept = []
+    for r in results:
+        url = r.get("url")
+        if not url:
+            continue
+        canonical = canonical_url(url)
+        site = domain(url)
+        if canonical in seen_urls or per_site.get(site, 0) >= per_domain:
+            continue
+        seen_urls.add(canonical)
+        per_site[site] = per_site.get(site, 0) + 1
+        kept.append(r)
+        if len(kept) >= limit:
+            break
+    return kept
+
+
+def format_results(results: list, max_tokens: int = SEARCH_SNIPPET_TOKENS) -> str:
+    """Compact block: '[n] Title (domain)' / truncated snippet / URL."""
+    lines = []
+    for n, r in enumerate(results, 1):
+        title = (r.get("title") or "No title").strip()
+        snippet = truncate_tokens(r.get("content") or "", max_tokens)
+        lines.append(f"[{n}] {title} ({domain(r['url'])})\n{snippet}\n{r['url']}")
+    return "\n".join(lines)
+
+
+#                           -- Client --
+
+class WebSearch:
+    """
+    Async Tavily search. Results are cached through SearchCache (queried on
+    a small thread pool since it is SQLite), identical in-flight queries
+    share one request, and several queries run concurrently.
+    """
+
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-cache")
+
+    def __init__(self, fetch_results: int = SEARCH_FETCH_RESULTS, timeout: float = SEARCH_TIMEOUT):
+        self.fetch_results = fetch_results
+        self.timeout = timeout
+        self.single_flight = SingleFlight()
+        self._client = None
+
+    def _tavily(self):
+        if self._client is None:
+            from tavily import AsyncTavilyClient
+            self._client = AsyncTavilyClient()
+        return self._client
+
+    async def search(self, query: str) -> list:
+        key = normalize_query(query)
+        return await self.single_flight.do(key, lambda: self._search(query), label="search")
+
+    async def _search(self, query: str) -> list:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self._executor, search_cache.get, query, self.fetch_results)
+        if results is not None:
+            return results
+
+        try:
+            response = await self._tavily().search(query=query, max_results=self.fetch_results, timeout=self.timeout)
+        except Exception as e:
+            raise SearchError(f"Tavily Search Failed : {type(e).__name__} {e}".strip()) from e
+        results = [
+            {"title": i.get("title"), "url": i.get("url"), "content": i.get("content")}
+            for i in response.get("results", [])
+        ]
+        if results:
+            await loop.run_in_executor(self._executor, search_cache.put, query, self.fetch_results, results)
+        return results
+
+    async def search_many(self, queries: list) -> dict:
+        """query -> results list, or the SearchError for that query."""
+        answers = await asyncio.gather(*(self.search(q) for q in queries), return_exceptions=True)
+        for i, answer in enumerate(answers):
+            if isinstance(answer, SearchError) or not isinstance(answer, BaseException):
+                continue
+            if not isinstance(answer, Exception):
+                raise answer  # cancellation
+            # e.g. the SQLite cache failing: still just a failed search
+            answers[i] = SearchError(f"Tavily Search Failed : {type(answer).__name__} {answer}".strip())
+            answers[i].__cause__ = answer
+        return dict(zip(queries, answers))
+
+
+web_search = WebSearch()
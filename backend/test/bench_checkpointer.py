@@ -0,0 +1,143 @@
+"""
+Checkpoint latency per graph step (backend/app/checkpointer.py).
+
+Replays a chat the way the graph checkpoints it: every turn is three
+steps (agent -> tools -> agent), each one put_writes + put of the whole
+message history, followed by the get_tuple the next step starts with.
+Compares MemorySaver with SQLiteCheckpointer as the history grows, then
+runs many sessions at once to show the writer grouping their commits.
+
+Run from the repo root:
+    python backend/test/bench_checkpointer.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import MemorySaver
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.checkpointer import SQLiteCheckpointer
+
+TURNS = 25
+SESSIONS = 50
+CONCURRENT_TURNS = 4
+
+
+def turn_messages(i):
+    listing = "".join(
+        f"- **Plant {j * 7 + i}** (ID: {123000 + j * 31 + i})\n  Status: ONLINE\n  Location: Karnataka\n"
+        for j in range(12)
+    )
+    call = {"id": f"call_{i}", "name": "list_solar_plants", "args": {"action": "list_all"}}
+    return [
+        HumanMessage(f"Question {i}: how are my plants doing?"),
+        AIMessage("", tool_calls=[call]),
+        ToolMessage(f"**Found 12 Solar Plants:**\n\n{listing}", tool_call_id=call["id"], name="list_solar_plants"),
+        AIMessage(f"All 12 plants are online; plant {i} produced the most today. " * 3),
+    ]
+
+
+class Thread:
+    """Checkpoint chain of one session, built like Pregel builds it."""
+
+    def __init__(self, saver, thread_id):
+        self.saver = saver
+        self.config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        self.messages = [SystemMessage("You are the Smart Solar Energy Assistant. " * 60)]
+        self.version = None
+        self.step = -1
+
+    def next_step(self, new_messages):
+        self.messages = self.messages + new_messages
+        self.version = self.saver.get_next_version(self.version, None)
+        self.step += 1
+        checkpoint = empty_checkpoint()
+        checkpoint["id"] = str(uuid6(clock_seq=self.step))
+        checkpoint["channel_values"] = {"messages": self.messages}
+        checkpoint["channel_versions"] = {"messages": self.version}
+        writes = [("messages", new_messages)]
+        return checkpoint, {"source": "loop", "step": self.step}, {"messages": self.version}, writes
+
+    def steps(self, turn):
+        m = turn_messages(turn)
+        return [m[:2], m[2:3], m[3:]]
+
+
+def replay(saver):
+    thread = Thread(saver, "bench")
+    put_ms, get_ms = [], []
+    for turn in range(TURNS):
+        for new in thread.steps(turn):
+            checkpoint, metadata, versions, writes = thread.next_step(new)
+            t0 = time.perf_counter()
+            if thread.step:
+                saver.put_writes(thread.config, writes, task_id=str(thread.step))
+            thread.config = saver.put(thread.config, checkpoint, metadata, versions)
+            put_ms.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            loaded = saver.get_tuple({"configurable": {"thread_id": "bench", "checkpoint_ns": ""}})
+            get_ms.append((time.perf_counter() - t0) * 1000)
+    assert loaded.checkpoint["channel_values"]["messages"] == thread.messages
+    return np.array(put_ms), np.array(get_ms), len(thread.messages)
+
+
+async def concurrent(saver):
+    async def session(i):
+        thread = Thread(saver, f"s{i}")
+        for turn in range(CONCURRENT_TURNS):
+            for new in thread.steps(turn):
+                checkpoint, metadata, versions, writes = thread.next_step(new)
+                if thread.step:
+                    await saver.aput_writes(thread.config, writes, task_id=str(thread.step))
+                thread.config = await saver.aput(thread.config, checkpoint, metadata, versions)
+                await saver.aget_tuple(thread.config)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(SESSIONS)))
+    return time.perf_counter() - t0
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    savers = {
+        "MemorySaver": MemorySaver(),
+        "SQLiteCheckpointer": SQLiteCheckpointer(os.path.join(directory, "replay.db")),
+    }
+    for name, saver in savers.items():
+        put_ms, get_ms, messages = replay(saver)
+        last = slice(-3, None)
+        print(
+            f"{name:18} put+writes median {np.median(put_ms):6.3f} ms  p95 {np.percentile(put_ms, 95):6.3f} ms"
+            f" | get median {np.median(get_ms):6.3f} ms  p95 {np.percentile(get_ms, 95):6.3f} ms"
+            f" | at {messages} msgs: put {put_ms[last].mean():6.3f} get {get_ms[last].mean():6.3f} ms"
+        )
+
+    sqlite = savers["SQLiteCheckpointer"]
+    stats = sqlite.stats()
+    print(
+        f"SQLite stored {stats['stored_bytes'] / 1024:,.0f} KiB for {stats['serialized_bytes'] / 1024:,.0f} KiB "
+        f"of msgpack ({stats['serialized_bytes'] / stats['stored_bytes']:.1f}x smaller)"
+    )
+
+    sqlite = SQLiteCheckpointer(os.path.join(directory, "concurrent.db"))
+    elapsed = asyncio.run(concurrent(sqlite))
+    stats = sqlite.stats()
+    steps = SESSIONS * CONCURRENT_TURNS * 3
+    print(
+        f"{SESSIONS} sessions at once: {steps / elapsed:,.0f} steps/s, {stats['writes']} writes in "
+        f"{stats['transactions']} transactions ({stats['writes_per_transaction']} per commit, "
+        f"{stats['avg_commit_ms']} ms each)"
+    )
+
+
+if __name__ == "__main__":
+    main()
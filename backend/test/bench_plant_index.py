@@ -0,0 +1,83 @@
+"""
+Lookup latency of the fuzzy plant-name index (backend/app/plant_index.py).
+
+Builds an index over 10,000 synthetic plant names and times exact,
+misspelled and partial-name queries. Target: sub-millisecond lookups.
+
+Run from the repo root:
+    python backend/test/bench_plant_index.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.isolarcloud import PlantSummary
+from backend.app.plant_index import PlantIndex
+
+PLANTS = 10_000
+QUERIES = 2_000
+
+WORDS = [
+    "ovobel", "foods", "rama", "burger", "king", "sunrise", "textiles", "agro",
+    "shree", "ganesh", "cold", "storage", "dairy", "mills", "pharma", "steel",
+    "green", "valley", "lakshmi", "industries", "hotel", "residency", "krishna",
+    "ceramics", "plastics", "motors", "spinning", "paper", "granite", "auto",
+]
+SUFFIXES = ["Limited", "Pvt Ltd", "Private Limited", "LLP", "", ""]
+
+
+def make_name(rng: random.Random, i: int) -> str:
+    words = rng.sample(WORDS, rng.randint(2, 3))
+    return " ".join(w.title() for w in words) + f" Unit {i}" + " " + rng.choice(SUFFIXES)
+
+
+def misspell(rng: random.Random, name: str) -> str:
+    chars = list(name)
+    pos = rng.randrange(len(chars))
+    chars[pos] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def main():
+    rng = random.Random(7)
+    plants = [
+        PlantSummary(ps_id=str(1_000_000 + i), ps_name=make_name(rng, i),
+                     ps_location=None, install_date=None, online_status=1)
+        for i in range(PLANTS)
+    ]
+
+    start = time.perf_counter()
+    index = PlantIndex(plants)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    cases = {
+        "exact": lambda p: p.ps_name,
+        "misspelled": lambda p: misspell(rng, p.ps_name),
+        "partial (no suffix)": lambda p: p.ps_name.rsplit(" Unit ", 1)[0] + " Unit " + p.ps_name.split(" Unit ")[1].split()[0],
+    }
+
+    print(f"index over {PLANTS} plants built in {build_ms:.1f} ms")
+    for label, make_query in cases.items():
+        targets = [rng.choice(plants) for _ in range(QUERIES)]
+        queries = [make_query(p) for p in targets]
+        timings = []
+        correct = 0
+        for target, query in zip(targets, queries):
+            t0 = time.perf_counter()
+            matches = index.search(query)
+            timings.append(time.perf_counter() - t0)
+            correct += bool(matches) and matches[0].ps_id == target.ps_id
+        timings.sort()
+        mean_us = sum(timings) / len(timings) * 1e6
+        p99_us = timings[int(len(timings) * 0.99) - 1] * 1e6
+        print(
+            f"{label:20} mean {mean_us:7.1f} us | p99 {p99_us:7.1f} us | "
+            f"top-1 correct {correct / QUERIES:6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
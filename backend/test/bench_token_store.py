@@ -0,0 +1,126 @@
+"""
+Event-loop stall benchmark for the OAuthToken store.
+
+Fires 200 concurrent POST /chat requests at the FastAPI app in-process and
+measures how late a 1 ms ticker on the same loop wakes up.
+Each simulated turn does the token-store work of TOOL_CALLS_PER_TURN tool
+calls, the way get_valid_token() did it before the in-memory cache
+(init_db + load_token per call):
+
+  before: the sync SQLAlchemy calls run directly on the event loop
+  after : the same calls go through token_repo (dedicated thread pool)
+
+A control run without any token I/O shows the stall caused by the
+in-process HTTP handling itself.
+
+Run from the repo root:
+    python backend/test/bench_token_store.py
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Never touch the real oauth.db
+os.environ["OAUTH_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_oauth.db")
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("TAVILY_API_KEY", "bench")
+
+import httpx
+
+from backend.app import main
+from backend.app.helper import load_token, save_token, token_repo
+from backend.app.models import init_db
+
+CONCURRENT_REQUESTS = 200
+TOOL_CALLS_PER_TURN = 3
+TICK = 0.001
+
+
+async def turn_baseline(user_message: str, session_id: str = "default"):
+    for _ in range(TOOL_CALLS_PER_TURN):
+        await asyncio.sleep(0)
+    return "ok"
+
+
+async def turn_blocking(user_message: str, session_id: str = "default"):
+    for _ in range(TOOL_CALLS_PER_TURN):
+        init_db()
+        load_token("isolarcloud")
+        await asyncio.sleep(0)  # stands in for the upstream API call
+    return "ok"
+
+
+async def turn_repo(user_message: str, session_id: str = "default"):
+    for _ in range(TOOL_CALLS_PER_TURN):
+        await token_repo.init()
+        await token_repo.load("isolarcloud")
+        await asyncio.sleep(0)
+    return "ok"
+
+
+async def measure(turn):
+    main.run_chatbot = turn
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(max(time.perf_counter() - start - TICK, 0.0))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tick_task = asyncio.create_task(ticker())
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/chat", json={"message": "list my plants", "session_id": f"s{i}"})
+            for i in range(CONCURRENT_REQUESTS)
+        ])
+        elapsed = time.perf_counter() - started
+        running = False
+        await tick_task
+
+    assert all(r.status_code == 200 for r in responses)
+    lags.sort()
+    return {
+        "wall_s": elapsed,
+        "max_stall_ms": lags[-1] * 1000,
+        "p99_stall_ms": lags[int(len(lags) * 0.99) - 1] * 1000,
+        "total_stall_ms": sum(lags) * 1000,
+    }
+
+
+async def run():
+    init_db()
+    save_token("isolarcloud", "bench-access", "bench-refresh", 3600)
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):  # load_token prints every row
+        for name, turn in (
+            ("no token I/O (control)", turn_baseline),
+            ("before (sync on loop)", turn_blocking),
+            ("after (token_repo)", turn_repo),
+        ):
+            await measure(turn)  # warm-up
+            results[name] = await measure(turn)
+
+    print(f"{CONCURRENT_REQUESTS} concurrent /chat requests, {TOOL_CALLS_PER_TURN} token lookups each")
+    for name, r in results.items():
+        print(
+            f"{name:24} wall {r['wall_s']*1000:8.1f} ms | "
+            f"max stall {r['max_stall_ms']:7.2f} ms | "
+            f"p99 stall {r['p99_stall_ms']:7.2f} ms | "
+            f"total stall {r['total_stall_ms']:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
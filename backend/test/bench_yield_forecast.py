@@ -0,0 +1,106 @@
+"""
+Fleet-wide expected-yield forecast (backend/app/solar_yield.py).
+
+Times the vectorized PV model on 1,000 plants x 168 hours, and the full
+YieldForecaster.forecast() path with the weather cache already warm, so
+only the local work is measured (array assembly + model). Target: well
+under a second.
+
+Run from the repo root:
+    python backend/test/bench_yield_forecast.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.isolarcloud import DetailBatch, PlantDetail, PlantSummary
+from backend.app.solar_yield import YIELD_VARIABLES, YieldForecaster, expected_energy_kwh
+from backend.app.weather import CURRENT_VARIABLES, WeatherClient, WeatherForecast, current_hour
+
+PLANTS = 1_000
+HOURS = 168
+RUNS = 20
+
+
+class FixedRegistry:
+    def __init__(self, plants):
+        self.plants = plants
+
+    async def get_plants(self):
+        return self.plants
+
+
+class FixedDetails:
+    def __init__(self, details):
+        self.details = {d.ps_id: d for d in details}
+
+    async def get_details(self, ps_ids):
+        return DetailBatch(plants=[self.details[i] for i in ps_ids], failures=[])
+
+
+def synthetic_hour_series(rng, hours):
+    """Daily irradiance bell with random cloudiness, plus temperature/cloud series."""
+    t = np.arange(hours)
+    sun = np.clip(np.sin((t % 24 - 6) / 12 * np.pi), 0, None)
+    cloud = rng.uniform(0, 100, hours)
+    ghi = 1000 * sun * (1 - 0.75 * (cloud / 100) ** 3.4)
+    return {
+        "shortwave_radiation": ghi.astype(np.float32),
+        "direct_radiation": (0.7 * ghi).astype(np.float32),
+        "diffuse_radiation": (0.3 * ghi).astype(np.float32),
+        "cloud_cover": cloud.astype(np.float32),
+        "temperature_2m": (25 + 8 * sun).astype(np.float32),
+    }
+
+
+def build(rng):
+    summaries, details = [], []
+    weather = WeatherClient(max_entries=PLANTS * 2)
+    day = current_hour() // 86400 * 86400
+    hourly_time = np.arange(day, day + 3600 * (HOURS + 48), 3600, dtype=np.int64)
+    for i in range(PLANTS):
+        lat, lon = rng.uniform(8, 30), rng.uniform(68, 90)
+        ps_id = str(1_000_000 + i)
+        summaries.append(PlantSummary(ps_id, f"Plant {i}", None, None, 1, lat, lon))
+        details.append(PlantDetail(ps_id, f"Plant {i}", None, None, rng.uniform(50, 5000) * 1000, None, None, 1))
+        # warm the cache exactly where the forecaster will look
+        weather._put(
+            weather.cache_key(lat, lon, YIELD_VARIABLES),
+            WeatherForecast(lat, lon, current_hour(), {v: 25.0 for v in CURRENT_VARIABLES},
+                            hourly_time, synthetic_hour_series(rng, len(hourly_time))),
+        )
+    return YieldForecaster(FixedRegistry(summaries), FixedDetails(details), weather)
+
+
+def main():
+    rng = np.random.default_rng(7)
+
+    capacity = rng.uniform(50, 5000, PLANTS)
+    irradiance = rng.uniform(0, 1000, (PLANTS, HOURS)).astype(np.float32)
+    temperature = rng.uniform(15, 40, (PLANTS, HOURS)).astype(np.float32)
+    timings = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        expected_energy_kwh(capacity, irradiance, temperature)
+        timings.append(time.perf_counter() - t0)
+    print(f"PV model {PLANTS} x {HOURS}:        median {np.median(timings) * 1000:7.2f} ms")
+
+    forecaster = build(rng)
+    timings = []
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        forecast = asyncio.run(forecaster.forecast(hours=HOURS))
+        timings.append(time.perf_counter() - t0)
+    print(
+        f"forecast() {PLANTS} plants, warm cache: median {np.median(timings) * 1000:7.2f} ms "
+        f"| max {max(timings) * 1000:7.2f} ms | fleet {forecast.total_kwh.sum() / 1000:,.0f} MWh"
+    )
+
+
+if __name__ == "__main__":
+    main()
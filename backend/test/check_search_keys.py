@@ -0,0 +1,50 @@
+"""
+Cache keys of the Tavily result cache (backend/app/search_cache.py).
+
+Rephrasings of one question must share a key so they hit the cache;
+different questions must not, or one question's results are served for
+the other until the entry expires. Exits non-zero on a mismatch.
+
+Run from the repo root:
+    python backend/test/check_search_keys.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.search_cache import normalize_query
+
+SAME = [
+    ("What is solar panel efficiency in 2024?", "what is  Solar-Panel efficiency 2024"),
+    ("Please show me the price of lithium batteries", "price of lithium batteries"),
+    ("How to clean solar panels", "how to clean the solar panels?"),
+]
+
+DIFFERENT = [
+    ("where is the solar plant", "why is the solar plant"),
+    ("how to install panels", "to install panels"),
+    ("what causes inverter faults", "when do inverter faults happen"),
+    ("which inverter is best", "who makes the best inverter"),
+    ("do panels work in snow", "do panels not work in snow"),
+    ("is net metering allowed", "is net metering no longer allowed"),
+]
+
+
+def main():
+    failures = 0
+    for a, b in SAME:
+        if normalize_query(a) != normalize_query(b):
+            failures += 1
+            print(f"FAIL same question, different keys: {normalize_query(a)!r} != {normalize_query(b)!r}")
+    for a, b in DIFFERENT:
+        if normalize_query(a) == normalize_query(b):
+            failures += 1
+            print(f"FAIL different questions share the key {normalize_query(a)!r}: {a!r} / {b!r}")
+    total = len(SAME) + len(DIFFERENT)
+    print(f"{total - failures}/{total} key checks passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
-from .weather import get_weather_forecast
+from .weather import get_weather_forecast, get_fleet_weather
 from .web_search import search_web
 from .solar2 import list_solar_plants 
 from .solar2 import solar_plants_basic_info
+from .solar2 import resolve_plant_ids
+from .solar_yield import forecast_solar_yield
+from backend.app.tool_executor import tool_executor
 
 
-ALL_TOOLS = [get_weather_forecast, search_web, list_solar_plants, solar_plants_basic_info]
+ALL_TOOLS = [get_weather_forecast, get_fleet_weather, search_web, list_solar_plants, resolve_plant_ids, solar_plants_basic_info, forecast_solar_yield]
+# tools named in TOOL_CONCURRENCY / TOOL_TIMEOUTS (search_web by default)
+# get a concurrency cap and timeout
+ALL_TOOLS = [tool_executor.offload(t) for t in ALL_TOOLS]
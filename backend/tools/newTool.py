@@ -1,24 +1,12 @@
-from dotenv import load_dotenv 
-from typing import Any
-import os 
-import json
-import httpx
 from langchain_core.tools import tool
 
 try:
-    from backend.app.helper import get_valid_token
+    from backend.app.isolarcloud import ISolarCloudError, isolarcloud
 except ImportError:
-    print("CRITICAL: Could not import 'get_valid_token' from helper.py")
+    print("CRITICAL: Could not import the iSolarCloud client from backend.app")
     exit(1)
 from pydantic import BaseModel, Field 
 
-load_dotenv()
-
-# Configuration
-SC_APP_KEY = os.getenv("SUNGROW_APP_KEY")
-SC_APP_SECRET = os.getenv("SUNGROW_APP_SECRET")
-API_BASE = "https://gateway.isolarcloud.com.hk"
-
 
 # --- 1. Simplified Schema ---
 class SolarPlantsBasicInfo(BaseModel):
@@ -39,61 +27,22 @@ async def solar_plants_basic_info(ps_ids: str)-> str:
     Return the Name, ID, Status, Location and summarize the general information for every plant asked by user. 
     """
     try:
-        access_token = await get_valid_token()
-    except Exception as e:
-        return f"Authentication Failed: Could not retrieve token. Error: {e}"
-
-    payload = {
-        "appkey": SC_APP_KEY,
-        "ps_ids": ps_ids, 
-    }
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-        "x-access-key": SC_APP_SECRET or ""
-    }
-    print(f"Target URL: {API_BASE}/openapi/platform/queryPowerStationList")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
-
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE}/openapi/platform/queryPowerStationList",
-                headers=headers,
-                json=payload,
-                timeout=10.0
-            )
-            # Raise error for bad HTTP status (4xx/5xx)
-            response.raise_for_status()
-            data = response.json()
-            
-    except httpx.HTTPStatusError as e:
-        return f"HTTP Error: {e.response.status_code} - {e.response.text}"
-    except Exception as e:
-        return f"Connection Error: {e}"
-
-    if data.get("result_code") != '1':
-        return f"iSolarCloud API Error: {data.get('result_msg', 'Unknown Error result code is 1')}"
-
-    result_data = data.get("result_data", {})
-    plants = result_data.get("pageList", [])
+        plants = await isolarcloud.get_power_station_detail(ps_ids)
+    except ISolarCloudError as e:
+        return str(e)
 
     output_lines = [f"**Found {len(plants)} Solar Plants:**"]
     
     for p in plants:
-        name = p.get("ps_name", "Unknown Name")
-        ps_id = p.get("ps_id", "N/A")
-        location = p.get("ps_location", "Unknown Location")
-        install_date = p.get("install_date", "N/A")
+        name = p.ps_name or "Unknown Name"
+        location = p.ps_location or "Unknown Location"
+        install_date = p.install_date or "N/A"
         
-        # Status mapping: 1 = Online, everything else = Offline/Fault/Unknown
         # Using simple text markers for clarity
-        is_online = p.get("online_status") == 1
-        status_str = "ONLINE" if is_online else "OFFLINE"
+        status_str = "ONLINE" if p.is_online else "OFFLINE"
 
         line = (
-            f"\n- **{name}** (ID: {ps_id})\n"
+            f"\n- **{name}** (ID: {p.ps_id})\n"
             f"  Status: {status_str}\n"
             f"  Location: {location}\n"
             f"  Installed: {install_date}"
@@ -1,27 +1,17 @@
-from dotenv import load_dotenv 
-from typing import Any
-import os 
-import json
-import httpx
 from langchain_core.tools import tool
 
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 try:
-    from backend.app.helper import get_valid_token
+    from backend.app.isolarcloud import ISolarCloudError
+    from backend.app.plant_registry import plant_detail_cache, plant_registry
+    from backend.app.plant_index import get_plant_index
 except ImportError:
-    print("CRITICAL: Could not import 'get_valid_token' from helper.py")
+    print("CRITICAL: Could not import the iSolarCloud client from backend.app")
     exit(1)
 from pydantic import BaseModel, Field 
 
-load_dotenv()
-
-# Configuration
-SC_APP_KEY = os.getenv("SUNGROW_APP_KEY")
-SC_APP_SECRET = os.getenv("SUNGROW_APP_SECRET")
-API_BASE = "https://gateway.isolarcloud.com.hk"
-
 
 # --- 1. Simplified Schema ---
 class ListSolarPlantsInput(BaseModel):
@@ -39,65 +29,24 @@ async def list_solar_plants(action: str = "list_all") -> str:
     No user-controlled arguments.
     This tool always fetches all plants.
     """
+    # Served from the process-wide registry; the plant list rarely changes
     try:
-        access_token = await get_valid_token()
-    except Exception as e:
-        return f"Authentication Failed: Could not retrieve token. Error: {e}"
-
-    payload = {
-        "appkey": SC_APP_KEY,
-        "page": 1, 
-        "size": 10, 
-        "ps_type": "1,3,4,5", 
-        "valid_flag": "1,3",
-    }
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-        "x-access-key": SC_APP_SECRET or ""
-    }
-    print(f"Target URL: {API_BASE}/openapi/platform/queryPowerStationList")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
-
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE}/openapi/platform/queryPowerStationList",
-                headers=headers,
-                json=payload,
-                timeout=10.0
-            )
-            # Raise error for bad HTTP status (4xx/5xx)
-            response.raise_for_status()
-            data = response.json()
-            
-    except httpx.HTTPStatusError as e:
-        return f"HTTP Error: {e.response.status_code} - {e.response.text}"
-    except Exception as e:
-        return f"Connection Error: {e}"
-
-    if data.get("result_code") != '1':
-        return f"iSolarCloud API Error: {data.get('result_msg', 'Unknown Error result code is 1')}"
-
-    result_data = data.get("result_data", {})
-    plants = result_data.get("pageList", [])
+        plants = await plant_registry.get_plants()
+    except ISolarCloudError as e:
+        return str(e)
 
     output_lines = [f"**Found {len(plants)} Solar Plants:**"]
     
     for p in plants:
-        name = p.get("ps_name", "Unknown Name")
-        ps_id = p.get("ps_id", "N/A")
-        location = p.get("ps_location", "Unknown Location")
-        install_date = p.get("install_date", "N/A")
+        name = p.ps_name or "Unknown Name"
+        location = p.ps_location or "Unknown Location"
+        install_date = p.install_date or "N/A"
         
-        # Status mapping: 1 = Online, everything else = Offline/Fault/Unknown
         # Using simple text markers for clarity
-        is_online = p.get("online_status") == 1
-        status_str = "ONLINE" if is_online else "OFFLINE"
+        status_str = "ONLINE" if p.is_online else "OFFLINE"
 
         line = (
-            f"\n- **{name}** (ID: {ps_id})\n"
+            f"\n- **{name}** (ID: {p.ps_id})\n"
             f"  Status: {status_str}\n"
             f"  Location: {location}\n"
             f"  Installed: {install_date}"
@@ -106,6 +55,43 @@ async def list_solar_plants(action: str = "list_all") -> str:
 
     return "\n".join(output_lines)
 
+# --- Schema for Name Resolution ---
+class ResolvePlantIdsInput(BaseModel):
+    names: str = Field(
+        description=(
+            "Plant names as the user wrote them, separated by semicolons. "
+            "Example: 'Ovobel Foods Limited;Rama burger king'."
+        )
+    )
+
+@tool(args_schema=ResolvePlantIdsInput)
+async def resolve_plant_ids(names: str) -> str:
+    """
+    Finds the numeric ps_id for each plant name, tolerating misspellings and
+    missing words. Returns the best matches with a similarity score (1.0 = exact).
+    Use the IDs it returns for solar_plants_basic_info.
+    """
+    try:
+        index = await get_plant_index()
+    except ISolarCloudError as e:
+        return str(e)
+
+    output_lines = []
+    best_ids = []
+    for name in [n.strip() for n in names.split(";") if n.strip()]:
+        matches = index.search(name)
+        if not matches:
+            output_lines.append(f"'{name}': no matching plant in this account")
+            continue
+        best_ids.append(matches[0].ps_id)
+        output_lines.append(f"'{name}':")
+        for m in matches:
+            output_lines.append(f"  - {m.ps_name} (ID: {m.ps_id}) score {m.score:.2f}")
+
+    if best_ids:
+        output_lines.append(f"Best match IDs: {','.join(best_ids)}")
+    return "\n".join(output_lines)
+
 # --- Schema for Tool 2---
 class SolarPlantsBasicInfo(BaseModel):
     # We use a string here because LLMs call strings 100% reliably.
@@ -133,64 +119,30 @@ async def solar_plants_basic_info(ps_ids: str)-> str:
     This tool performs data retrieval only.
     The calling agent is responsible for interpreting and formatting the output.
     """
+    # Cached plants are served locally; only the missing IDs go upstream
+    # (in chunks fetched concurrently when the list is large)
     try:
-        access_token = await get_valid_token()
-    except Exception as e:
-        return f"Authentication Failed: Could not retrieve token. Error: {e}"
-
-    payload = {
-        "appkey": SC_APP_KEY,
-        "ps_ids": ps_ids, 
-    }
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-        "x-access-key": SC_APP_SECRET or ""
-    }
-    print(f"Target URL: {API_BASE}/openapi/platform/getPowerStationDetail")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
+        batch = await plant_detail_cache.get_details(ps_ids)
+    except ISolarCloudError as e:
+        return str(e)
+    plants = batch.plants
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE}/openapi/platform/getPowerStationDetail",
-                headers=headers,
-                json=payload,
-                timeout=10.0
-            )
-            # Raise error for bad HTTP status (4xx/5xx)
-            response.raise_for_status()
-            data = response.json()
-            
-    except httpx.HTTPStatusError as e:
-        return f"HTTP Error: {e.response.status_code} - {e.response.text}"
-    except Exception as e:
-        return f"Connection Error: {e}"
-
-    if data.get("result_code") != '1':
-        return f"iSolarCloud API Error: {data.get('result_msg', 'Unknown Error result code is 1')}"
-
-    result_data = data.get("result_data", {})
-    plants = result_data.get("data_list", [])
+    if not plants and batch.failures:
+        return batch.failures[0].error
 
     output_lines = [f"**Found {len(plants)} Solar Plants:**\n"]
     for p in plants:
         # 1. Gather fields with safe fallbacks
-        name = p.get("ps_name") or "Unnamed Plant"
-        pid = p.get("ps_id", "N/A")
-        loc = p.get("ps_location") or "Location not specified"
-        date = p.get("install_date") or "Date not provided"
-        # Convert power from Watts to Kilowatts if present
-        power_w = p.get("install_power")
-        capacity = f"{float(power_w)/1000:.2f} kW" if power_w else "Unknown"
+        name = p.ps_name or "Unnamed Plant"
+        pid = p.ps_id
+        loc = p.ps_location or "Location not specified"
+        date = p.install_date or "Date not provided"
+        capacity = f"{p.capacity_kw:.2f} kW" if p.capacity_kw else "Unknown"
         
         # Pricing handling - prevent "None None"
-        price = p.get("ps_feedin_power_price_wh")
-        unit = p.get("power_price_unit")
-        price_str = f"{price} {unit}" if price and unit else "Price data not available"
+        price_str = f"{p.feedin_price} {p.price_unit}" if p.feedin_price and p.price_unit else "Price data not available"
 
-        status = "ONLINE" if p.get("online_status") == 1 else "OFFLINE"
+        status = "ONLINE" if p.is_online else "OFFLINE"
 
         # 2. Build a structured block for the LLM to read
         plant_info = (
@@ -204,5 +156,10 @@ async def solar_plants_basic_info(ps_ids: str)-> str:
             f"---"
         )
         output_lines.append(plant_info)
+
+    for failure in batch.failures:
+        output_lines.append(
+            f"COULD NOT FETCH DETAILS FOR IDs {','.join(failure.ps_ids)}: {failure.error}"
+        )
     
     return "\n".join(output_lines)
@@ -0,0 +1,70 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.app.isolarcloud import ISolarCloudError
+from backend.app.solar_yield import yield_forecaster
+from backend.app.weather import WeatherError
+
+
+class SolarYieldInput(BaseModel):
+    ps_ids: str = Field(
+        default="",
+        description="Comma-separated numeric plant IDs. Leave empty for every plant in the account."
+    )
+    hours: int = Field(
+        default=24,
+        description="How many hours ahead to forecast (1-168)."
+    )
+
+
+def _utc(ts) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%a %H:%M UTC")
+
+
+@tool(args_schema=SolarYieldInput)
+async def forecast_solar_yield(ps_ids: str = "", hours: int = 24) -> str:
+    """
+    Expected solar energy (kWh) per plant for the coming hours, from forecast
+    irradiance, cloud cover and temperature combined with each plant's
+    installed capacity. Use it for "how much will my plants produce" questions.
+    """
+    hours = max(1, min(int(hours), 168))
+    try:
+        forecast = await yield_forecaster.forecast(ps_ids, hours)
+    except (ISolarCloudError, WeatherError) as e:
+        return str(e)
+
+    if not forecast.plants:
+        reasons = "; ".join(f"{pid}: {why}" for pid, why in forecast.skipped.items())
+        return f"No plant could be forecast. {reasons}".strip()
+
+    total = forecast.total_kwh
+    peak = forecast.peak_hour
+    rows = np.arange(len(forecast.plants))
+    peak_kwh = forecast.energy_kwh[rows, peak]
+    # average cloud cover over the hours that actually produce
+    daylight = forecast.energy_kwh > 0
+    cloud = np.where(daylight, np.nan_to_num(forecast.cloud_cover), 0).sum(axis=1) / np.maximum(daylight.sum(axis=1), 1)
+
+    output_lines = [
+        f"**Expected Solar Yield, next {hours} h "
+        f"(hours ending {_utc(forecast.hourly_time[0])} to {_utc(forecast.hourly_time[-1])}):**"
+    ]
+    for i, p in enumerate(forecast.plants):
+        output_lines.append(
+            f"- **{p.ps_name or 'Unnamed Plant'}** (ID: {p.ps_id}, {p.capacity_kw:.1f} kW): "
+            f"{total[i]:.1f} kWh | peak hour ending {_utc(forecast.hourly_time[peak[i]])} "
+            f"({peak_kwh[i]:.1f} kWh) | avg daytime cloud {cloud[i]:.0f}%"
+        )
+    output_lines.append(f"\n**Fleet total: {total.sum():.1f} kWh**")
+
+    for ps_id, reason in forecast.skipped.items():
+        output_lines.append(f"NOT FORECAST {ps_id}: {reason}")
+    output_lines.append("(Estimate from forecast irradiance; actual output depends on tilt, shading and outages.)")
+    return "\n".join(output_lines)
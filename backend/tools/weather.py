@@ -1,60 +1,112 @@
-import openmeteo_requests
+import os
+import sys
+from datetime import datetime, timezone
+
 import numpy as np
 from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.app.isolarcloud import ISolarCloudError
+from backend.app.plant_registry import plant_registry
+from backend.app.weather import WeatherError, weather_client
 
-openmeteo = openmeteo_requests.Client()
 
 @tool
-def get_weather_forecast(latitude: float, longitude: float):
+async def get_weather_forecast(latitude: float, longitude: float):
     """
     Fetch Current temp, hum, and hourly forecast from open-meteo
     Args:
         latitude: float (e.g. 12.97)
         longitude: float (e.g. 77.59)
     """
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude" : latitude,
-        "longitude" : longitude,
-        "hourly" : ["temperature_2m", "precipitation", "wind_speed_10m"],
-        "current" : ["temperature_2m", "relative_humidity_2m"],
-    }
+    # Cached per ~0.1 deg grid cell and forecast hour; nearby plants share it
+    try:
+        response = await weather_client.get_forecast(latitude, longitude)
+    except WeatherError as e:
+        return str(e)
 
     try:
-        responses = openmeteo.weather_api(url, params=params)
-        response = responses[0]
-    except Exception as e : 
-        return f"Error fetching weather : {e}"
-    
-    current = response.Current()
-    temp_now = current.Variables(0).Value()
-    humidity_now = current.Variables(1).Value()
-
-    hourly = response.Hourly()
-    temp_series = hourly.Variables(0).ValuesAsNumpy()
-    prec_series = hourly.Variables(1).ValuesAsNumpy()
-    wind_series = hourly.Variables(2).ValuesAsNumpy()
-
-    forecast = []
-    for i in range(3):
-        forecast.append(
-            f" Temp : {temp_series[i]:.1f} C | "
-            f" Wind : {wind_series[i]:.1f} Km/h | "
-            f" Rain : {prec_series[i]:.1f} mm"
-        )
+        temp_now = float(response.current["temperature_2m"])
+        humidity_now = float(response.current["relative_humidity_2m"])
+        current_time = datetime.fromtimestamp(response.current_time, tz=timezone.utc)
+
+        start = response.hour_index()
+        temp_series = response.hourly["temperature_2m"][start:]
+        prec_series = response.hourly["precipitation"][start:]
+        wind_series = response.hourly["wind_speed_10m"][start:]
+
+        forecast = []
+        for i in range(min(3, len(temp_series))):
+            forecast.append(
+                f" Temp : {temp_series[i]:.1f} C | "
+                f" Wind : {wind_series[i]:.1f} Km/h | "
+                f" Rain : {prec_series[i]:.1f} mm"
+            )
+    except (KeyError, ValueError, IndexError, TypeError) as e:
+        # a forecast missing a variable or with a short/empty series
+        return f"Error fetching weather : unexpected forecast data ({type(e).__name__} {e})"
     report = f"""
-    Weather Data Retrieved: 
-    Location : {response.Latitude():.2f}, {response.Longitude():.2f}
-    Current Time : {current.Time()} 
+    Weather Data Retrieved:
+    Location : {response.latitude:.2f}, {response.longitude:.2f}
+    Current Time : {current_time:%Y-%m-%d %H:%M} UTC
     Current Temperature : {temp_now:.1f} C
     Humidity : {humidity_now:.1f}%
-    
+
     Next 3 Hours Forecast:
     {chr(10).join(forecast)}
     """
     return report
 
 
+class FleetWeatherInput(BaseModel):
+    action: str = Field(
+        default="all_plants",
+        description="Always use 'all_plants'."
+    )
 
 
+@tool(args_schema=FleetWeatherInput)
+async def get_fleet_weather(action: str = "all_plants") -> str:
+    """
+    Weather for the next 24 hours at every solar plant in the account, in one
+    call. Use this instead of calling get_weather_forecast once per plant.
+    """
+    try:
+        plants = await plant_registry.get_plants()
+    except ISolarCloudError as e:
+        return str(e)
+
+    located = [p for p in plants if p.coordinates is not None]
+    if not located:
+        return "None of the plants in this account have coordinates."
+    try:
+        fleet = await weather_client.get_fleet_forecast([p.coordinates for p in located])
+    except WeatherError as e:
+        return str(e)
+
+    try:
+        # (plants, 24) windows starting at the current hour
+        start = fleet.hour_index()
+        temp = fleet.hourly["temperature_2m"][:, start:start + 24]
+        rain = fleet.hourly["precipitation"][:, start:start + 24]
+        wind = fleet.hourly["wind_speed_10m"][:, start:start + 24]
+        temp_min, temp_max = np.nanmin(temp, axis=1), np.nanmax(temp, axis=1)
+        rain_total = np.nansum(rain, axis=1)
+        wind_max = np.nanmax(wind, axis=1)
+        temp_now = fleet.current["temperature_2m"]
 
+        output_lines = [f"**Next 24 Hours Weather for {len(located)} Plants:**"]
+        for i, p in enumerate(located):
+            output_lines.append(
+                f"- **{p.ps_name or 'Unknown Name'}** (ID: {p.ps_id}): "
+                f"now {temp_now[i]:.1f} C | {temp_min[i]:.1f}-{temp_max[i]:.1f} C | "
+                f"rain {rain_total[i]:.1f} mm | wind up to {wind_max[i]:.1f} Km/h"
+            )
+    except (KeyError, ValueError, IndexError, TypeError) as e:
+        # e.g. no forecast hours left in the window, so nanmin has nothing to reduce
+        return f"Error fetching weather : unexpected forecast data ({type(e).__name__} {e})"
+    skipped = len(plants) - len(located)
+    if skipped:
+        output_lines.append(f"\n({skipped} plants have no coordinates and were skipped.)")
+    return "\n".join(output_lines)
@@ -1,27 +1,35 @@
-from tavily import TavilyClient
 from langchain_core.tools import tool
 from dotenv import load_dotenv
-import os 
+import os
+import sys
 
-load_dotenv()
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.app.web_search import dedupe_results, format_results, web_search
 
-tavily = TavilyClient()
+load_dotenv()
 
 @tool
-def search_web(query: str):
+async def search_web(query: str):
     """
     Perform a real internet search using Tavily.
     Use this to find information not present in your training data.
+    Several queries can be searched at once by separating them with ';'.
     """
-    try:
-        result = tavily.search(query=query, max_results=5)
-        summaries = []
-        for i in result.get("results", []):
-            title = i.get("title", "No title")
-            link = i.get("url", "No Link")
-            snippet = i.get("content", "")
-            summaries.append(f"Title: {title}\nSnippet: {snippet}\nLink: {link}")
-        return "\n\n".join(summaries)
-    except Exception as e :
-        return "Tavily Search Failed : {e}"
+    queries = list(dict.fromkeys(q.strip() for q in query.split(";") if q.strip()))
+    if not queries:
+        return "Tavily Search Failed : empty query"
+
+    # Cached queries are answered locally; the rest run concurrently
+    answers = await web_search.search_many(queries)
 
+    # results repeated across queries (or sites) are shown once, snippets
+    # are cut to a token budget to keep the next model call small
+    seen_urls = set()
+    sections = []
+    for q, results in answers.items():
+        if isinstance(results, Exception):
+            block = str(results)
+        else:
+            block = format_results(dedupe_results(results, seen_urls=seen_urls)) or "No results."
+        sections.append(f"Results for '{q}':\n{block}" if len(queries) > 1 else block)
+    return "\n\n".join(sections)
@@ -3,6 +3,7 @@ import requests
 #import asyncio
 #import sys
 import os 
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +18,36 @@ root_dir = os.path.dirname(curr_dir)
 #    sys.path.append(os.path.abspath("."))
 #    from backend.app.main import run_chatbot
 API_URL = "https://test-bot-spgp.onrender.com/chat"
+STREAM_URL = API_URL + "/stream"
+
+
+@st.cache_resource
+def http_session():
+    # one keep-alive connection pool for every rerun of the script
+    return requests.Session()
+
+
+def stream_events(prompt, session_id):
+    """Yield (event, data) pairs from the /chat/stream SSE endpoint."""
+    with http_session().post(
+        STREAM_URL,
+        json={"message": prompt, "session_id": session_id},
+        stream=True,
+        timeout=(10, 120),
+    ) as resp:
+        resp.raise_for_status()
+        event, data = "message", []
+        for line in resp.iter_lines(decode_unicode=True):
+            if line is None or line.startswith(":"):
+                continue  # keep-alive comment
+            if line == "":
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
 
 #------------------------------------
 st.set_page_config(
@@ -85,20 +116,34 @@ if prompt := st.chat_input("Ask about your solar plants..."):
     st.session_state.messages.append({"role" : "user", "content" : prompt})
     with chat_display:
         with st.chat_message("assistant"):
+            status_placeholder = st.empty()
             message_placeholder = st.empty()
             try:
-                with st.spinner("Analyzing solar data..."):
-                    #response = asyncio.run(run_chatbot(prompt, session_id = session_id))
-                    resp = requests.post(
-                        API_URL,
-                        json={"message": prompt, "session_id": session_id},
-                        timeout=120
-                    )
-
-                    resp.raise_for_status()
-                    bot_reply = resp.json()["response"]
-                    message_placeholder.markdown(bot_reply)
-                    st.session_state.messages.append({"role" : "assistant", "content" : bot_reply})
+                #response = asyncio.run(run_chatbot(prompt, session_id = session_id))
+                bot_reply = ""
+                tools_running = {}
+                status_placeholder.caption("Analyzing solar data...")
+                for event, data in stream_events(prompt, session_id):
+                    if event == "token":
+                        bot_reply += data["content"]
+                        message_placeholder.markdown(bot_reply + "▌")
+                    elif event == "tool_start":
+                        tools_running[data["id"]] = data["name"]
+                        status_placeholder.caption(f"Running {', '.join(tools_running.values())}...")
+                    elif event == "tool_end":
+                        tools_running.pop(data["id"], None)
+                        status_placeholder.caption(
+                            f"Running {', '.join(tools_running.values())}..." if tools_running
+                            else "Analyzing solar data..."
+                        )
+                    elif event == "error":
+                        raise RuntimeError(data.get("message", "stream failed"))
+                    elif event == "done":
+                        bot_reply = data["response"]
+                status_placeholder.empty()
+                message_placeholder.markdown(bot_reply)
+                st.session_state.messages.append({"role" : "assistant", "content" : bot_reply})
             except Exception as e:
+                status_placeholder.empty()
                 error_msg = f" System Error: {str(e)}"
                 message_placeholder.error(error_msg)